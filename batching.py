@@ -0,0 +1,240 @@
+"""
+Write batching
+
+Two ways of turning many small writes into a few large ones.
+
+WriteBehindBuffer absorbs bursts of writes to the same key (a user dragging a
+slider sends many preference updates in a row): the latest value per key is
+kept in memory and a background task hands the pending set to an async flush
+function once `max_batch` keys are waiting or `max_delay` seconds have passed.
+Callers return as soon as their value is buffered. At most `max_pending`
+keys are held (put() raises RuntimeError beyond that), and a key whose
+flush fails `max_retries` times in a row is dropped, so an unreachable
+database costs bounded memory and shows up as errors rather than silently.
+
+Coalescing is per process; with several workers the flush function must
+itself make sure an older value never overwrites a newer one (see
+flush_preferences in main.py).
+
+GroupCommitter is for writes that must not be coalesced or acknowledged
+early (new subscriptions): concurrent `submit()` calls are collected for at
+most `max_wait` seconds (or until `max_batch` arrive), written with one
+`commit(list)` call, and each caller then gets its own result or exception.
+
+Buffers are local to a worker process. Values not yet flushed are lost if the
+process dies without running `drain()`, so only use this for writes where
+that is acceptable.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BUFFER_LABELS = ("buffer",)
+
+buffer_flush_latency = metrics.Histogram("write_buffer_flush_duration_seconds", "Write-behind flush latency", BUFFER_LABELS)
+buffer_flushed = metrics.Counter("write_buffer_flushed_total", "Keys written by write-behind flushes", BUFFER_LABELS)
+buffer_coalesced = metrics.Counter("write_buffer_coalesced_total", "Buffered writes replaced by a newer write to the same key", BUFFER_LABELS)
+buffer_flush_failures = metrics.Counter("write_buffer_flush_failures_total", "Write-behind flushes that raised", BUFFER_LABELS)
+buffer_dropped = metrics.Counter("write_buffer_dropped_total", "Buffered writes dropped after repeated flush failures", BUFFER_LABELS)
+buffer_rejected = metrics.Counter("write_buffer_rejected_total", "Writes rejected because the buffer was full", BUFFER_LABELS)
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500)
+
+group_commit_latency = metrics.Histogram("group_commit_duration_seconds", "Group commit write latency", BUFFER_LABELS)
+group_commit_size = metrics.Histogram("group_commit_batch_size", "Items per group commit", BUFFER_LABELS, buckets=BATCH_SIZE_BUCKETS)
+
+_buffers: list = []
+metrics.CallbackMetric(
+    "write_buffer_pending", "Keys or items waiting to be written", BUFFER_LABELS,
+    lambda: {(b.name,): b.pending() for b in _buffers},
+)
+
+
+class WriteBehindBuffer:
+    """Last-write-wins buffer flushed by `flush(dict of key -> value)` in the background"""
+
+    def __init__(
+        self,
+        name: str,
+        flush: Callable[[Dict[Hashable, Any]], Awaitable[Any]],
+        max_batch: int = 500,
+        max_delay: float = 0.05,
+        max_pending: int = 10000,
+        max_retries: int = 5,
+    ):
+        self.name = name
+        self.flush = flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self._pending: Dict[Hashable, Any] = {}
+        # key -> consecutive failed flushes of its current value
+        self._attempts: Dict[Hashable, int] = {}
+        # Batch currently being written, still visible to get()
+        self._in_flight: Dict[Hashable, Any] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        _buffers.append(self)
+
+    def pending(self) -> int:
+        return len(self._pending) + len(self._in_flight)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """The buffered value for `key` not yet confirmed written, else `default`"""
+        if key in self._pending:
+            return self._pending[key]
+        return self._in_flight.get(key, default)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self._closed:
+            raise RuntimeError(f"write buffer {self.name!r} is closed")
+        if key in self._pending:
+            buffer_coalesced.inc(self.name)
+        elif self.pending() >= self.max_pending:
+            buffer_rejected.inc(self.name)
+            raise RuntimeError(f"write buffer {self.name!r} is full")
+        self._pending[key] = value
+        self._attempts.pop(key, None)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        # After drain() starts, finish at most one more flush and leave the rest to it
+        while self._pending and not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush_once()
+
+    async def _flush_once(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._in_flight = batch
+        started = time.perf_counter()
+        try:
+            await self.flush(batch)
+        except Exception:
+            buffer_flush_failures.inc(self.name)
+            logger.exception("write buffer %s: flush of %d keys failed", self.name, len(batch))
+            dropped = 0
+            for key, value in batch.items():
+                if key in self._pending:
+                    continue  # a newer write replaced it meanwhile
+                attempts = self._attempts.get(key, 0) + 1
+                if attempts >= self.max_retries:
+                    self._attempts.pop(key, None)
+                    dropped += 1
+                    continue
+                self._attempts[key] = attempts
+                self._pending[key] = value
+            if dropped:
+                buffer_dropped.inc(self.name, amount=dropped)
+                logger.error("write buffer %s: dropped %d keys after %d failed flushes", self.name, dropped, self.max_retries)
+            if not self._closed and self._pending:
+                # Back off while the database is failing
+                await asyncio.sleep(min(self.max_delay * 2 ** max(self._attempts.values(), default=0), 5.0))
+        else:
+            buffer_flushed.inc(self.name, amount=len(batch))
+            for key in batch:
+                self._attempts.pop(key, None)
+        finally:
+            self._in_flight = {}
+            buffer_flush_latency.observe(self.name, value=time.perf_counter() - started)
+
+    async def drain(self, attempts: int = 3) -> None:
+        """Stop accepting writes and flush everything still buffered (call on shutdown)"""
+        self._closed = True
+        if self._task is not None and not self._task.done():
+            self._wakeup.set()
+            await self._task
+        for _ in range(attempts):
+            if not self._pending:
+                return
+            await self._flush_once()
+        if self._pending:
+            logger.error("write buffer %s: dropping %d unflushed keys", self.name, len(self._pending))
+
+
+class GroupCommitter:
+    """Writes concurrent `submit(item)` calls as batches through `commit(items) -> results`.
+
+    `commit` returns one result per item, in order; a result that is an
+    exception is raised to that item's caller only. If `commit` itself
+    raises, every caller in the batch gets the error.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        commit: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch: int = 200,
+        max_wait: float = 0.003,
+    ):
+        self.name = name
+        self.commit = commit
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight: set = set()
+        _buffers.append(self)
+
+    def pending(self) -> int:
+        return len(self._queue)
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((item, future))
+        if len(self._queue) >= self.max_batch:
+            self._start_commit()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._start_commit)
+        return await future
+
+    def _start_commit(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._queue:
+            return
+        batch, self._queue = self._queue, []
+        task = asyncio.get_running_loop().create_task(self._commit(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _commit(self, batch: List[tuple]) -> None:
+        group_commit_size.observe(self.name, value=len(batch))
+        started = time.perf_counter()
+        try:
+            results = await self.commit([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            group_commit_latency.observe(self.name, value=time.perf_counter() - started)
+        for (_, future), result in zip(batch, results):
+            # The caller may have gone away (client disconnect cancels it)
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def drain(self) -> None:
+        """Commit anything queued and wait for in-flight batches (call on shutdown)"""
+        self._start_commit()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
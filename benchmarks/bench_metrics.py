@@ -0,0 +1,56 @@
+"""
+Overhead benchmark for metrics.MetricsMiddleware
+
+Drives a trivial ASGI app directly (no sockets, no HTTP parsing) with and
+without the middleware, so the difference is the middleware's own cost.
+
+    python -m benchmarks.bench_metrics [--requests 100000]
+"""
+import argparse
+import asyncio
+import time
+
+import metrics
+
+
+class _Route:
+    path = "/meals"
+
+
+async def plain_app(scope, receive, send):
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b'{"items":[]}'})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def drive(app, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        await app({"type": "http", "method": "GET", "path": "/meals"}, receive, send)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100_000)
+    args = parser.parse_args()
+
+    bare = asyncio.run(drive(plain_app, args.requests))
+    wrapped = asyncio.run(drive(metrics.MetricsMiddleware(plain_app), args.requests))
+    per_request_us = (wrapped - bare) / args.requests * 1e6
+    print(f"{args.requests} requests")
+    print(f"  bare app        : {bare * 1000:8.1f} ms")
+    print(f"  with middleware : {wrapped * 1000:8.1f} ms")
+    print(f"  overhead        : {per_request_us:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
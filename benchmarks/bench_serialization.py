@@ -0,0 +1,79 @@
+"""
+Serialization benchmark for GET /meals payloads
+
+Compares the previous path (rewrite `_id` per document, `jsonable_encoder`,
+stdlib JSONResponse) with MongoJSONResponse rendering MongoDocuments directly.
+
+    python -m benchmarks.bench_serialization [--meals 10000] [--repeat 5]
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from serialization import MongoDocument, MongoJSONResponse
+
+
+def make_meals(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        MongoDocument(
+            _id=ObjectId(),
+            title=f"Meal {i}",
+            description="Grilled chicken, quinoa, veggies.",
+            category="Main Meals",
+            diet_tags=["gluten-free"] if i % 2 else [],
+            price=12.99,
+            macros=MongoDocument(protein=50.0, carbs=40.0, fats=12.0, calories=520.0),
+            image_url=None,
+            is_customizable=False,
+            available_add_ons=None,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def legacy_render(meals: list) -> bytes:
+    items = []
+    for m in meals:
+        m = dict(m)
+        m["id"] = str(m.pop("_id"))
+        items.append(m)
+    return JSONResponse(jsonable_encoder({"items": items})).body
+
+
+def orjson_render(meals: list) -> bytes:
+    return MongoJSONResponse({"items": meals}).body
+
+
+def best_of(fn, meals: list, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(meals)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    meals = make_meals(args.meals)
+    legacy = best_of(legacy_render, meals, args.repeat)
+    fast = best_of(orjson_render, meals, args.repeat)
+    print(f"{args.meals} meals, best of {args.repeat}")
+    print(f"  jsonable_encoder + json : {legacy * 1000:8.2f} ms")
+    print(f"  MongoJSONResponse       : {fast * 1000:8.2f} ms")
+    print(f"  speedup                 : {legacy / fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
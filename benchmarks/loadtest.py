@@ -0,0 +1,322 @@
+"""
+Load test and regression check for the API
+
+Boots main:app with uvicorn in this process, seeds the catalog, replays a
+request mix from several client threads and reports requests/sec and
+p50/p95/p99 latency per endpoint (method + path without query string).
+
+Request mixes:
+  default             built-in mix weighted towards the catalog reads
+  --mix FILE.jsonl    one {"method", "path", "json"?, "weight"?} object per
+                      line; "{meal_id}" inside a path or body is replaced
+                      with a seeded meal id, lines without "path" are skipped
+  --log FILE          uvicorn access lines (e.g. logs/server.log); POST
+                      bodies are synthesized per endpoint
+
+Regression check:
+  --check             compare against benchmarks/baseline.json and exit 1 if
+                      an endpoint's p95 is slower or its throughput lower
+                      than the baseline by more than --tolerance
+  --write-baseline    store this run's numbers as the new baseline
+
+The booted app uses the in-process Mongo stand-in (DATABASE_BACKEND=memory)
+unless DATABASE_URL is set, so no Mongo server is needed.
+
+    python -m benchmarks.loadtest --duration 20 --concurrency 32 --check
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import requests
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+ACCESS_LINE = re.compile(r'"(GET|POST|PUT|PATCH|DELETE) (\S+) HTTP/[\d.]+" (\d{3})')
+
+DEFAULT_MIX = [
+    {"method": "GET", "path": "/meals", "weight": 30},
+    {"method": "GET", "path": "/meals?min_protein=25", "weight": 30},
+    {"method": "GET", "path": "/meals?category=Breakfasts&fields=title,price,macros", "weight": 10},
+    {"method": "POST", "path": "/meals/portion", "weight": 15},
+    {"method": "POST", "path": "/subscriptions", "weight": 5},
+    {"method": "POST", "path": "/preferences", "weight": 10},
+]
+
+
+@dataclass
+class RequestSpec:
+    method: str
+    path: str
+    body: Optional[dict] = None
+    weight: float = 1.0
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.method} {self.path.split('?', 1)[0]}"
+
+
+@dataclass
+class EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+
+def load_mix_file(path: str) -> List[RequestSpec]:
+    specs = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if "path" not in entry:
+                continue
+            specs.append(RequestSpec(entry.get("method", "GET").upper(), entry["path"], entry.get("json"), float(entry.get("weight", 1))))
+    return specs
+
+
+def load_access_log(path: str) -> List[RequestSpec]:
+    """Every access line becomes one entry, so the log's proportions are kept"""
+    specs = []
+    with open(path) as f:
+        for line in f:
+            match = ACCESS_LINE.search(line)
+            if match and match.group(3).startswith("2"):
+                specs.append(RequestSpec(match.group(1), match.group(2)))
+    return specs
+
+
+def synthesize_body(spec: RequestSpec, meal_ids: List[str], rng: random.Random) -> Optional[dict]:
+    """Fill in request bodies for mixes that only carry method and path"""
+    if spec.body is not None:
+        return json.loads(json.dumps(spec.body).replace("{meal_id}", rng.choice(meal_ids)))
+    if spec.method != "POST":
+        return None
+    endpoint = spec.path.split("?", 1)[0]
+    if endpoint == "/meals/portion":
+        return {"meal_id": rng.choice(meal_ids), "servings": rng.choice([0.5, 1, 1.5, 2])}
+    if endpoint == "/meals/portion/batch":
+        return {"items": [{"meal_id": rng.choice(meal_ids), "servings": 1} for _ in range(5)]}
+    if endpoint == "/subscriptions":
+        return {
+            "email": f"bench{rng.randrange(10**6)}@example.com",
+            "frequency": rng.choice(["weekly", "biweekly", "monthly"]),
+            "target_protein_g_per_day": 150,
+            "items": [{"meal_id": rng.choice(meal_ids), "servings": 1}],
+        }
+    if endpoint == "/preferences":
+        return {
+            "email": f"bench{rng.randrange(1000)}@example.com",
+            "target_protein_g_per_day": rng.choice([100, 120, 150, 180]),
+            "diet_filters": rng.choice([[], ["vegan"], ["keto"]]),
+        }
+    return None
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int):
+    if not os.getenv("DATABASE_URL"):
+        os.environ.setdefault("DATABASE_BACKEND", "memory")
+    import uvicorn
+
+    config = uvicorn.Config("main:app", host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("API server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def run_load(base_url: str, mix: List[RequestSpec], meal_ids: List[str], concurrency: int, duration: float, seed: int) -> Dict[str, EndpointStats]:
+    weights = [spec.weight for spec in mix]
+    deadline = time.monotonic() + duration
+    results: List[Dict[str, EndpointStats]] = []
+
+    def worker(index: int):
+        rng = random.Random(seed + index)
+        session = requests.Session()
+        stats: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+        results.append(stats)
+        while time.monotonic() < deadline:
+            spec = rng.choices(mix, weights)[0]
+            body = synthesize_body(spec, meal_ids, rng)
+            start = time.perf_counter()
+            try:
+                response = session.request(spec.method, base_url + spec.path, json=body, timeout=30)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            entry = stats[spec.endpoint]
+            entry.latencies.append(elapsed)
+            if not ok:
+                entry.errors += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    merged: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+    for stats in results:
+        for endpoint, entry in stats.items():
+            merged[endpoint].latencies.extend(entry.latencies)
+            merged[endpoint].errors += entry.errors
+    return merged
+
+
+def summarize(stats: Dict[str, EndpointStats], duration: float) -> Dict[str, dict]:
+    summary = {}
+    for endpoint, entry in sorted(stats.items()):
+        latencies = sorted(entry.latencies)
+        summary[endpoint] = {
+            "requests": len(latencies),
+            "errors": entry.errors,
+            "rps": round(len(latencies) / duration, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+    return summary
+
+
+def print_report(summary: Dict[str, dict]) -> None:
+    print(f"{'endpoint':32} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, row in summary.items():
+        print(f"{endpoint:32} {row['requests']:>9} {row['errors']:>7} {row['rps']:>9} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}")
+
+
+def check_baseline(summary: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Regressions against the baseline; endpoints missing from this run are reported too"""
+    failures = []
+    for endpoint, expected in baseline.items():
+        if endpoint.startswith("_"):
+            continue  # run metadata, e.g. "_environment"
+        row = summary.get(endpoint)
+        if row is None:
+            failures.append(f"{endpoint}: not exercised by this run")
+            continue
+        if row["errors"]:
+            failures.append(f"{endpoint}: {row['errors']} failed requests")
+        if "p95_ms" in expected and row["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            failures.append(f"{endpoint}: p95 {row['p95_ms']} ms > baseline {expected['p95_ms']} ms")
+        if "rps" in expected and row["rps"] < expected["rps"] * (1 - tolerance):
+            failures.append(f"{endpoint}: {row['rps']} req/s < baseline {expected['rps']} req/s")
+    return failures
+
+
+def environment(args) -> dict:
+    """Where a baseline was measured; numbers only compare on similar hardware"""
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu = next(line.split(":", 1)[1].strip() for line in f if line.startswith("model name"))
+    except (OSError, StopIteration):
+        pass
+    return {
+        "cpu": cpu,
+        "cpu_count": os.cpu_count(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "database_backend": os.environ.get("DATABASE_BACKEND", "mongo"),
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "target": args.url or "in-process uvicorn",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--mix", help="JSONL request mix")
+    source.add_argument("--log", help="uvicorn access log to replay")
+    parser.add_argument("--url", help="Target an already running server instead of booting main:app")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--write-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.mix:
+        mix = load_mix_file(args.mix)
+    elif args.log:
+        mix = load_access_log(args.log)
+    else:
+        mix = [RequestSpec(e["method"], e["path"], weight=e["weight"]) for e in DEFAULT_MIX]
+    if not mix:
+        parser.error("request mix is empty")
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        port = free_port()
+        server, _ = start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        requests.post(base_url + "/seed", timeout=30).raise_for_status()
+        meals = requests.get(base_url + "/meals", params={"fields": "title"}, timeout=30).json()["items"]
+        meal_ids = [m["id"] for m in meals]
+        if not meal_ids:
+            raise RuntimeError("catalog is empty after seeding")
+
+        stats = run_load(base_url, mix, meal_ids, args.concurrency, args.duration, args.seed)
+    finally:
+        if server is not None:
+            server.should_exit = True
+
+    summary = summarize(stats, args.duration)
+    print_report(summary)
+
+    if args.write_baseline:
+        with open(args.baseline, "w") as f:
+            baseline = {"_environment": environment(args)}
+            baseline.update({k: {"p95_ms": v["p95_ms"], "rps": v["rps"]} for k, v in summary.items()})
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = check_baseline(summary, baseline, args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+        print("no regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
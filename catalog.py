@@ -0,0 +1,149 @@
+"""
+Column-oriented meal catalog snapshot
+
+CatalogSnapshot keeps the whole meal catalog in memory as parallel NumPy
+arrays (one row per meal, ordered by _id) so catalog-wide filtering, sorting
+and portion scaling are vectorized operations rather than per-document
+Python loops. The raw documents are kept alongside for rendering responses.
+
+Snapshots are immutable; main.py rebuilds one after meal writes or when its
+TTL expires.
+"""
+import itertools
+from typing import Iterable, List, Optional, Tuple, get_args
+
+import numpy as np
+
+from schemas import CategoryType, Macros, diet_mask
+
+CATEGORIES = get_args(CategoryType)
+MACRO_COLUMNS = tuple(Macros.model_fields)  # protein, carbs, fats, calories
+SORTS = ("id", "protein", "protein_per_dollar")
+
+_CATEGORY_CODES = {name: i for i, name in enumerate(CATEGORIES)}
+_serials = itertools.count(1)
+
+
+class CatalogSnapshot:
+    def __init__(self, docs: List[dict]):
+        n = len(docs)
+        # Distinguishes snapshots in cache keys derived from one
+        self.serial = next(_serials)
+        self.docs = docs
+        self.ids = [str(d["_id"]) for d in docs]
+        # ObjectId hex strings sort like the ObjectIds themselves
+        self.id_keys = np.array(self.ids, dtype="U24")
+        self.row_of = {meal_id: row for row, meal_id in enumerate(self.ids)}
+
+        # One contiguous row per macro: macros[0] is every meal's protein
+        self.macros = np.zeros((len(MACRO_COLUMNS), n))
+        self.price = np.zeros(n)
+        self.category = np.full(n, -1, dtype=np.int8)
+        self.diet = np.zeros(n, dtype=np.uint8)
+        for row, d in enumerate(docs):
+            m = d.get("macros") or {}
+            for col, key in enumerate(MACRO_COLUMNS):
+                self.macros[col, row] = m.get(key, 0.0)
+            self.price[row] = d.get("price", 0.0)
+            self.category[row] = _CATEGORY_CODES.get(d.get("category"), -1)
+            mask = d.get("diet_mask")
+            self.diet[row] = mask if mask is not None else diet_mask(d.get("diet_tags"))
+        self.protein, self.carbs, self.fats, self.calories = self.macros
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.protein_per_dollar = np.where(self.price > 0, self.protein / self.price, np.inf)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def select(
+        self,
+        category: Optional[str] = None,
+        diet: Optional[str] = None,
+        min_protein: Optional[float] = None,
+        diets: Iterable[str] = (),
+        match: str = "all",
+        categories: Optional[Iterable[str]] = None,
+    ) -> np.ndarray:
+        """Boolean row mask; `diet` needs that one tag, `diets` needs all (or any) of them"""
+        mask = np.ones(len(self), dtype=bool)
+        if category:
+            mask &= self.category == _CATEGORY_CODES.get(category, -2)
+        if categories:
+            codes = [_CATEGORY_CODES[c] for c in categories if c in _CATEGORY_CODES]
+            mask &= np.isin(self.category, codes)
+        if diet:
+            mask &= (self.diet & diet_mask([diet])) != 0
+        wanted = diet_mask(diets)
+        if wanted:
+            if match == "any":
+                mask &= (self.diet & wanted) != 0
+            else:
+                mask &= (self.diet & wanted) == wanted
+        if min_protein is not None:
+            mask &= self.protein >= min_protein
+        return mask
+
+    def sort_key(self, sort: str, row: int) -> list:
+        """Cursor key of a row: [id], [protein, id] or [protein_per_dollar, id]"""
+        if sort == "protein":
+            return [float(self.protein[row]), self.ids[row]]
+        if sort == "protein_per_dollar":
+            return [float(self.protein_per_dollar[row]), self.ids[row]]
+        return [self.ids[row]]
+
+    def page(self, mask: np.ndarray, sort: str, after: Optional[list], limit: int) -> Tuple[np.ndarray, Optional[list]]:
+        """Rows of one page in `sort` order plus the cursor key for the next page.
+
+        Orders match GET /meals on Mongo: id ascending, (protein, id)
+        ascending, or protein per dollar descending with id ascending.
+        """
+        rows = np.flatnonzero(mask)
+        if sort == "protein":
+            primary = self.protein[rows]
+        elif sort == "protein_per_dollar":
+            primary = -self.protein_per_dollar[rows]
+        else:
+            primary = None
+
+        if after:
+            later_id = self.id_keys[rows] > after[-1]
+            if primary is None:
+                keep = later_id
+            else:
+                last = after[0] if sort == "protein" else -after[0]
+                keep = (primary > last) | ((primary == last) & later_id)
+            rows = rows[keep]
+            if primary is not None:
+                primary = primary[keep]
+
+        if primary is not None:
+            # Rows are in id order, so a stable sort keeps id as the tiebreaker
+            rows = rows[np.argsort(primary, kind="stable")]
+
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, self.sort_key(sort, int(rows[-1]))
+
+    def rows_for(self, meal_ids: List[str]) -> np.ndarray:
+        """Row index per meal id, -1 where the id is not in the catalog"""
+        return np.fromiter((self.row_of.get(m, -1) for m in meal_ids), dtype=np.int64, count=len(meal_ids))
+
+    def scale(self, rows: np.ndarray, factors: np.ndarray) -> np.ndarray:
+        """Macros of `rows` multiplied by per-row factors, shape (len(rows), len(MACRO_COLUMNS))"""
+        return self.macros[:, rows].T * factors[:, None]
+
+    def rank_by_protein_fit(self, mask: np.ndarray, protein_per_meal: float) -> np.ndarray:
+        """Rows of `mask` ordered best first for someone eating ~protein_per_meal per meal.
+
+        The score is closeness of a meal's protein to that amount, with
+        protein per dollar (scaled to at most 0.1) as a tiebreaker.
+        """
+        rows = np.flatnonzero(mask)
+        if rows.size == 0:
+            return rows
+        fit = 1.0 - np.abs(self.protein[rows] - protein_per_meal) / protein_per_meal
+        value = np.nan_to_num(self.protein_per_dollar[rows], posinf=0.0)
+        if value.max() > 0:
+            fit += 0.1 * value / value.max()
+        return rows[np.argsort(-fit, kind="stable")]
@@ -3,53 +3,711 @@ Database Helper Functions
 
 MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
+
+The plain helpers use blocking pymongo and are meant for scripts such as
+schema_examples.py. Every helper has an ``async_`` twin backed by Motor for
+use from ``async def`` endpoints, so requests never block the event loop.
+
+Clients are opened lazily on first use in each process (see get_db and
+get_async_db), so importing this module never connects and preforked workers
+each own their pool.
 """
 
-from pymongo import MongoClient
+from pymongo import MongoClient, IndexModel, UpdateOne, ASCENDING, monitoring
+from pymongo.errors import BulkWriteError, OperationFailure, WriteError
+from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timezone
 import os
-from dotenv import load_dotenv
-from typing import Union
+import logging
+import threading
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from bson import ObjectId
 from pydantic import BaseModel
 
-# Load environment variables from .env file
-load_dotenv()
+from serialization import MongoDocument
+from settings import MongoSettings
+from memory_backend import MemoryClient, AsyncMemoryClient
+import metrics
+
+logger = logging.getLogger(__name__)
+
+mongo_settings = MongoSettings.from_env()
+
+# Command monitoring: per collection/command latency plus a slow-command log
+SLOW_COMMAND_MS = mongo_settings.slow_command_ms
+
+mongo_command_latency = metrics.Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("collection", "command", "outcome"),
+)
+
+# Where each command keeps the part of its body that shapes the query
+_FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "aggregate": "pipeline",
+    "findAndModify": "query",
+}
+
+def redact(value):
+    """Keep a query's keys and operators but replace every value with '?'"""
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = redact(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+def _filter_shape(command_name: str, command) -> object:
+    field = _FILTER_FIELDS.get(command_name)
+    if field is not None:
+        return redact(command.get(field, {}))
+    # update/delete carry a list of statements, each with its own `q`
+    statements = command.get(command_name + "s")
+    if isinstance(statements, list):
+        return redact([stmt.get("q", {}) for stmt in statements if isinstance(stmt, dict)])
+    return None
+
+class CommandMonitor(monitoring.CommandListener):
+    """Times every command and logs the ones slower than `slow_ms`.
+
+    Events from Motor arrive on driver threads, so shared state is locked.
+    """
+
+    def __init__(self, slow_ms: float = SLOW_COMMAND_MS):
+        self.slow_ms = slow_ms
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        self._started[(event.connection_id, event.request_id)] = (collection, event.command)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+    def _finish(self, event, outcome: str):
+        collection, command = self._started.pop((event.connection_id, event.request_id), ("-", None))
+        elapsed = event.duration_micros / 1e6
+        with self._lock:
+            mongo_command_latency.observe(collection, event.command_name, outcome, value=elapsed)
+        if elapsed * 1000 >= self.slow_ms:
+            shape = _filter_shape(event.command_name, command) if command is not None else None
+            logger.warning(
+                "Slow MongoDB command %s on %s: %.1f ms (%s) filter=%s",
+                event.command_name, collection, elapsed * 1000, outcome, shape,
+            )
+
+command_monitor = CommandMonitor()
+
+# Connection pool monitoring, one listener per client
+POOL_LABELS = ("client", "address")
+mongo_pool_connections = metrics.Gauge("mongo_pool_connections", "Open pooled connections", POOL_LABELS)
+mongo_pool_in_use = metrics.Gauge("mongo_pool_connections_in_use", "Pooled connections checked out", POOL_LABELS)
+mongo_pool_waiters = metrics.Gauge("mongo_pool_waiters", "Operations waiting for a pooled connection", POOL_LABELS)
+mongo_pool_checkout_failures = metrics.Counter(
+    "mongo_pool_checkout_failures_total", "Failed connection checkouts", POOL_LABELS + ("reason",),
+)
+metrics.CallbackMetric(
+    "mongo_pool_max_size", "Configured maxPoolSize", (), lambda: {(): mongo_settings.max_pool_size},
+)
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks open, checked-out and waiting connections per server"""
+
+    def __init__(self, client_label: str):
+        self.client_label = client_label
+        self._lock = threading.Lock()
+
+    def _labels(self, event):
+        host, port = event.address
+        return self.client_label, f"{host}:{port}"
+
+    def _inc(self, gauge, event, amount=1):
+        with self._lock:
+            gauge.inc(*self._labels(event), amount=amount)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._inc(mongo_pool_connections, event)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._inc(mongo_pool_connections, event, -1)
+
+    def connection_check_out_started(self, event):
+        self._inc(mongo_pool_waiters, event)
+
+    def connection_check_out_failed(self, event):
+        self._inc(mongo_pool_waiters, event, -1)
+        with self._lock:
+            mongo_pool_checkout_failures.inc(*self._labels(event), str(event.reason))
+
+    def connection_checked_out(self, event):
+        self._inc(mongo_pool_waiters, event, -1)
+        self._inc(mongo_pool_in_use, event)
 
+    def connection_checked_in(self, event):
+        self._inc(mongo_pool_in_use, event, -1)
+
+def pool_stats() -> dict:
+    """Current pool utilization per client and server address"""
+    stats = {}
+    for name, gauge in (("open", mongo_pool_connections), ("in_use", mongo_pool_in_use), ("waiting", mongo_pool_waiters)):
+        for (client_label, address), value in gauge.samples().items():
+            stats.setdefault(client_label, {}).setdefault(address, {})[name] = value
+    for servers in stats.values():
+        for entry in servers.values():
+            entry["max_size"] = mongo_settings.max_pool_size
+    return stats
+
+# Clients are created lazily, once per process. A client inherited across
+# fork() shares sockets and threads with the parent and must not be reused,
+# so each accessor rebuilds its client when the process id changes.
 _client = None
-db = None
+_client_pid = None
+_async_client = None
+_async_client_pid = None
+_client_lock = threading.RLock()
 
-database_url = os.getenv("DATABASE_URL")
-database_name = os.getenv("DATABASE_NAME")
+def _client_options(label: str) -> dict:
+    # Documents come back as MongoDocument so responses can serialize them as-is
+    return dict(
+        document_class=MongoDocument,
+        event_listeners=[command_monitor, PoolMonitor(label)],
+        **mongo_settings.client_kwargs(),
+    )
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+def get_client() -> Optional[MongoClient]:
+    """The process's pymongo client, or None when the database is not configured"""
+    global _client, _client_pid
+    if not mongo_settings.configured:
+        return None
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                if mongo_settings.backend == "memory":
+                    _client = MemoryClient(document_class=MongoDocument)
+                else:
+                    _client = MongoClient(mongo_settings.url, **_client_options("sync"))
+                _client_pid = pid
+    return _client
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+def get_async_client() -> Optional[AsyncIOMotorClient]:
+    """The process's Motor client, or None when the database is not configured"""
+    global _async_client, _async_client_pid
+    if not mongo_settings.configured:
+        return None
+    pid = os.getpid()
+    if _async_client is None or _async_client_pid != pid:
+        with _client_lock:
+            if _async_client is None or _async_client_pid != pid:
+                if mongo_settings.backend == "memory":
+                    # Shares the sync client's store so both APIs see the same data
+                    _async_client = AsyncMemoryClient(get_client())
+                else:
+                    _async_client = AsyncIOMotorClient(mongo_settings.url, **_client_options("async"))
+                _async_client_pid = pid
+    return _async_client
+
+def get_db():
+    client = get_client()
+    return client[mongo_settings.database_name] if client is not None else None
+
+def get_async_db():
+    client = get_async_client()
+    return client[mongo_settings.database_name] if client is not None else None
+
+def close_clients():
+    """Close the clients owned by this process (call on shutdown)"""
+    global _client, _client_pid, _async_client, _async_client_pid
+    with _client_lock:
+        pid = os.getpid()
+        if _client is not None and _client_pid == pid:
+            _client.close()
+        if _async_client is not None and _async_client_pid == pid:
+            _async_client.close()
+        _client = _client_pid = _async_client = _async_client_pid = None
+
+def __getattr__(name: str):
+    # `database.db` / `database.async_db` keep working for scripts, resolved on access
+    if name == "db":
+        return get_db()
+    if name == "async_db":
+        return get_async_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+DATABASE_NOT_AVAILABLE = "Database not available. Check DATABASE_URL and DATABASE_NAME environment variables."
+
+# Indexes backing the API's query shapes, keyed by collection name
+INDEXES = {
+    # GET /meals sorts by _id or by (macros.protein, _id) after equality
+    # filters on category and diet_tags. Each index puts the sort keys right
+    # after those filters, so pages come off the index in order, and ends
+    # with macros.protein where min_protein can't bound the scan, so it is
+    # tested on index keys before any document is fetched
+    "meal": [
+        IndexModel([("title", ASCENDING)], unique=True),
+        IndexModel([("_id", ASCENDING), ("macros.protein", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("_id", ASCENDING), ("macros.protein", ASCENDING)]),
+        IndexModel([("diet_tags", ASCENDING), ("_id", ASCENDING), ("macros.protein", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("diet_tags", ASCENDING), ("_id", ASCENDING), ("macros.protein", ASCENDING)]),
+        IndexModel([("macros.protein", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("macros.protein", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("diet_tags", ASCENDING), ("macros.protein", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("diet_tags", ASCENDING), ("macros.protein", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "delivery": [
+        IndexModel([("subscription_id", ASCENDING), ("delivery_date", ASCENDING)], unique=True),
+        IndexModel([("delivery_date", ASCENDING)]),
+    ],
+}
+
+# Unique fields that may hold duplicates written before their index existed
+# (racing /seed calls on meal titles). Extra documents are deleted before the
+# index is built, keeping the oldest (lowest _id) per value.
+DEDUPLICATE_BEFORE_INDEXING = {"meal": "title"}
+
+def _duplicates_pipeline(field: str) -> list:
+    return [
+        {"$sort": {"_id": ASCENDING}},
+        {"$group": {"_id": f"${field}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+
+def _extra_ids(collection_name: str, field: str, groups: List[dict]) -> list:
+    extra = [_id for group in groups for _id in group["ids"][1:]]
+    for group in groups:
+        logger.warning("%s: %d documents with %s=%r, keeping %s", collection_name, group["count"], field, group["_id"], group["ids"][0])
+    return extra
+
+def _index_build_failed(collection_name: str, index: IndexModel, error: OperationFailure) -> None:
+    # A duplicate can still be written between the cleanup and the build;
+    # serve without this index and try again on the next startup
+    if error.code != 11000:
+        raise error
+    logger.error("%s: index %s not built, existing documents have duplicate keys: %s", collection_name, index.document["name"], error)
 
+
+def _prepare_document(data: Union[BaseModel, dict]) -> dict:
+    """Convert a model or dict into a timestamped document"""
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
     else:
         data_dict = data.copy()
 
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
+    now = datetime.now(timezone.utc)
+    data_dict['created_at'] = now
+    data_dict['updated_at'] = now
+    return data_dict
+
+def _bulk_insert_ops(docs: list, key: str) -> list:
+    """Upserts keyed on `key` that only write when no match exists"""
+    return [UpdateOne({key: d[key]}, {"$setOnInsert": d}, upsert=True) for d in docs]
+
+def _bulk_insert_summary(docs: list, key: Optional[str], result=None, error: BulkWriteError = None) -> dict:
+    """Normalize insert_many/bulk_write outcomes to {"inserted_ids", "matched"}"""
+    if error is not None:
+        details = error.details
+        # Losing a race on the unique key means another writer inserted it
+        if any(e.get("code") != 11000 for e in details.get("writeErrors", [])):
+            raise error
+        upserted = {u["index"]: u["_id"] for u in details.get("upserted", [])}
+        return {
+            "inserted_ids": [str(upserted[i]) for i in sorted(upserted)],
+            "matched": len(docs) - len(upserted),
+        }
+    if key is None:
+        return {"inserted_ids": [str(i) for i in result.inserted_ids], "matched": 0}
+    upserted = result.upserted_ids
+    return {
+        "inserted_ids": [str(upserted[i]) for i in sorted(upserted)],
+        "matched": result.matched_count,
+    }
+
+def _per_item_results(docs: list, error: BulkWriteError = None) -> list:
+    """Inserted id (as a string) or WriteError per document of an unordered insert_many"""
+    failed = {}
+    if error is not None:
+        details = error.details
+        if details.get("writeConcernErrors"):
+            raise error
+        failed = {e["index"]: WriteError(e.get("errmsg", "write failed"), e.get("code"), e) for e in details.get("writeErrors", [])}
+    # insert_many sets the generated _id on each document it was given
+    return [failed[i] if i in failed else str(d["_id"]) for i, d in enumerate(docs)]
+
+DocumentTarget = Union[str, ObjectId, dict]
+
+def _target_filter(target: DocumentTarget) -> dict:
+    """A document id (string or ObjectId) or a filter dict, as a filter"""
+    if isinstance(target, dict):
+        return target
+    return {"_id": target if isinstance(target, ObjectId) else ObjectId(target)}
+
+def _update_spec(update: Union[BaseModel, dict, list]) -> Union[dict, list]:
+    """An update document with `updated_at` stamped; plain fields are wrapped in $set.
+
+    A list is an aggregation pipeline update and is sent unchanged; it is
+    responsible for its own timestamps.
+    """
+    if isinstance(update, list):
+        return update
+    if isinstance(update, BaseModel):
+        update = update.model_dump()
+    now = datetime.now(timezone.utc)
+    if any(k.startswith("$") for k in update):
+        spec = dict(update)
+        spec["$set"] = {**spec.get("$set", {}), "updated_at": now}
+        return spec
+    return {"$set": {**update, "updated_at": now}}
 
-    result = db[collection_name].insert_one(data_dict)
+def _bulk_update_ops(updates: Iterable[Tuple[DocumentTarget, Union[BaseModel, dict]]], upsert: bool) -> list:
+    return [UpdateOne(_target_filter(target), _update_spec(update), upsert=upsert) for target, update in updates]
+
+def _bulk_update_summary(result) -> dict:
+    return {
+        "matched": result.matched_count,
+        "modified": result.modified_count,
+        "upserted": len(result.upserted_ids),
+    }
+
+# Helper functions for common database operations
+def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    db = get_db()
+    if db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    result = db[collection_name].insert_one(_prepare_document(data))
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+def create_documents(collection_name: str, items: Iterable[Union[BaseModel, dict]], key: str = None):
+    """Insert many documents with timestamps in one unordered batch.
+
+    With `key`, each document is upserted on that field instead, so re-running
+    is idempotent and concurrent callers cannot double-insert (pair it with a
+    unique index on `key`). Returns {"inserted_ids": [...], "matched": n}.
+    """
+    db = get_db()
     if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    docs = [_prepare_document(d) for d in items]
+    if not docs:
+        return {"inserted_ids": [], "matched": 0}
+    try:
+        if key is None:
+            result = db[collection_name].insert_many(docs, ordered=False)
+        else:
+            result = db[collection_name].bulk_write(_bulk_insert_ops(docs, key), ordered=False)
+    except BulkWriteError as e:
+        if key is None:
+            raise
+        return _bulk_insert_summary(docs, key, error=e)
+    return _bulk_insert_summary(docs, key, result)
+
+def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None, sort: list = None):
+    """Get documents from collection, optionally projected, sorted and limited"""
+    db = get_db()
+    if db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
     
-    cursor = db[collection_name].find(filter_dict or {})
+    cursor = db[collection_name].find(filter_dict or {}, projection)
+    if sort:
+        cursor = cursor.sort(sort)
     if limit:
         cursor = cursor.limit(limit)
     
     return list(cursor)
+
+def iter_document_batches(collection_name: str, filter_dict: dict = None, projection: dict = None, batch_size: int = 1000) -> Iterator[List[dict]]:
+    """Stream matching documents in _id order as lists of at most `batch_size`.
+
+    Reads through one server-side cursor fetching `batch_size` documents per
+    round trip, so memory stays bounded however large the collection is.
+    """
+    db = get_db()
+    if db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    cursor = db[collection_name].find(filter_dict or {}, projection).sort("_id", ASCENDING).batch_size(batch_size)
+    try:
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        cursor.close()
+
+def update_document(collection_name: str, target: DocumentTarget, update: Union[BaseModel, dict], upsert: bool = False):
+    """Update one document by id or filter, stamping updated_at; returns the modified count"""
+    db = get_db()
+    if db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    result = db[collection_name].update_one(_target_filter(target), _update_spec(update), upsert=upsert)
+    return result.modified_count
+
+def update_documents(collection_name: str, filter_dict: dict, update: Union[BaseModel, dict]):
+    """Update every document matching the filter, stamping updated_at; returns the modified count"""
+    db = get_db()
+    if db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    result = db[collection_name].update_many(filter_dict, _update_spec(update))
+    return result.modified_count
+
+def update_documents_bulk(collection_name: str, updates: Iterable[Tuple[DocumentTarget, Union[BaseModel, dict]]], upsert: bool = False):
+    """Apply many (id or filter, update) pairs in one unordered bulk_write.
+
+    Returns {"matched": n, "modified": n, "upserted": n}.
+    """
+    db = get_db()
+    if db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    ops = _bulk_update_ops(updates, upsert)
+    if not ops:
+        return {"matched": 0, "modified": 0, "upserted": 0}
+    return _bulk_update_summary(db[collection_name].bulk_write(ops, ordered=False))
+
+def delete_document(collection_name: str, target: DocumentTarget):
+    """Delete one document by id or filter; returns the deleted count"""
+    db = get_db()
+    if db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    return db[collection_name].delete_one(_target_filter(target)).deleted_count
+
+def delete_documents(collection_name: str, filter_dict: dict):
+    """Delete every document matching the filter; returns the deleted count"""
+    db = get_db()
+    if db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    return db[collection_name].delete_many(filter_dict).deleted_count
+
+def ensure_indexes():
+    """Create the indexes in INDEXES (no-op for ones that already exist).
+
+    Duplicates of the fields in DEDUPLICATE_BEFORE_INDEXING are deleted first;
+    a unique index that still cannot be built is logged and skipped.
+    """
+    db = get_db()
+    if db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        field = DEDUPLICATE_BEFORE_INDEXING.get(collection_name)
+        if field is not None:
+            extra = _extra_ids(collection_name, field, list(collection.aggregate(_duplicates_pipeline(field))))
+            if extra:
+                collection.delete_many({"_id": {"$in": extra}})
+        # One index at a time, so a failed unique build leaves the others in place
+        for index in indexes:
+            try:
+                collection.create_indexes([index])
+            except OperationFailure as e:
+                _index_build_failed(collection_name, index, e)
+
+# Async (Motor) twins for use inside the event loop
+async def async_create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    result = await async_db[collection_name].insert_one(_prepare_document(data))
+    return str(result.inserted_id)
+
+async def async_create_documents(collection_name: str, items: Iterable[Union[BaseModel, dict]], key: str = None):
+    """Insert many documents with timestamps in one unordered batch (see create_documents)"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    docs = [_prepare_document(d) for d in items]
+    if not docs:
+        return {"inserted_ids": [], "matched": 0}
+    try:
+        if key is None:
+            result = await async_db[collection_name].insert_many(docs, ordered=False)
+        else:
+            result = await async_db[collection_name].bulk_write(_bulk_insert_ops(docs, key), ordered=False)
+    except BulkWriteError as e:
+        if key is None:
+            raise
+        return _bulk_insert_summary(docs, key, error=e)
+    return _bulk_insert_summary(docs, key, result)
+
+async def async_create_documents_per_item(collection_name: str, items: Iterable[Union[BaseModel, dict]]) -> list:
+    """Insert many documents in one unordered insert_many.
+
+    Unlike async_create_documents, a failing document does not fail the
+    call: the result lists, in input order, each document's inserted id or
+    the WriteError it hit.
+    """
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    docs = [_prepare_document(d) for d in items]
+    if not docs:
+        return []
+    try:
+        await async_db[collection_name].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        return _per_item_results(docs, e)
+    return _per_item_results(docs)
+
+async def async_get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None, sort: list = None):
+    """Get documents from collection, optionally projected, sorted and limited"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    cursor = async_db[collection_name].find(filter_dict or {}, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    return await cursor.to_list(length=None)
+
+async def async_find_one(collection_name: str, filter_dict: dict, projection: dict = None):
+    """Get a single document matching the filter, or None"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    return await async_db[collection_name].find_one(filter_dict, projection)
+
+async def async_update_one(collection_name: str, filter_dict: dict, update: dict, upsert: bool = False):
+    """Apply an update document to the first match; returns the modified count"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    result = await async_db[collection_name].update_one(filter_dict, update, upsert=upsert)
+    return result.modified_count
+
+async def async_update_document(collection_name: str, target: DocumentTarget, update: Union[BaseModel, dict], upsert: bool = False):
+    """Update one document by id or filter, stamping updated_at; returns the modified count"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    result = await async_db[collection_name].update_one(_target_filter(target), _update_spec(update), upsert=upsert)
+    return result.modified_count
+
+async def async_update_documents(collection_name: str, filter_dict: dict, update: Union[BaseModel, dict]):
+    """Update every document matching the filter, stamping updated_at; returns the modified count"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    result = await async_db[collection_name].update_many(filter_dict, _update_spec(update))
+    return result.modified_count
+
+async def async_update_documents_bulk(collection_name: str, updates: Iterable[Tuple[DocumentTarget, Union[BaseModel, dict]]], upsert: bool = False):
+    """Apply many (id or filter, update) pairs in one unordered bulk_write (see update_documents_bulk)"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    ops = _bulk_update_ops(updates, upsert)
+    if not ops:
+        return {"matched": 0, "modified": 0, "upserted": 0}
+    return _bulk_update_summary(await async_db[collection_name].bulk_write(ops, ordered=False))
+
+async def async_delete_document(collection_name: str, target: DocumentTarget):
+    """Delete one document by id or filter; returns the deleted count"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    result = await async_db[collection_name].delete_one(_target_filter(target))
+    return result.deleted_count
+
+async def async_delete_documents(collection_name: str, filter_dict: dict):
+    """Delete every document matching the filter; returns the deleted count"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    result = await async_db[collection_name].delete_many(filter_dict)
+    return result.deleted_count
+
+async def async_aggregate(collection_name: str, pipeline: list):
+    """Run an aggregation pipeline on the server and return every result document"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    return await async_db[collection_name].aggregate(pipeline).to_list(length=None)
+
+async def async_count_documents(collection_name: str, filter_dict: dict = None):
+    """Count documents in collection"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    return await async_db[collection_name].count_documents(filter_dict or {})
+
+async def async_estimated_document_count(collection_name: str):
+    """Document count from collection metadata (no scan; may lag after an unclean shutdown)"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    return await async_db[collection_name].estimated_document_count()
+
+async def async_ensure_indexes():
+    """Create the indexes in INDEXES (see ensure_indexes)"""
+    async_db = get_async_db()
+    if async_db is None:
+        raise Exception(DATABASE_NOT_AVAILABLE)
+
+    for collection_name, indexes in INDEXES.items():
+        collection = async_db[collection_name]
+        field = DEDUPLICATE_BEFORE_INDEXING.get(collection_name)
+        if field is not None:
+            groups = await collection.aggregate(_duplicates_pipeline(field)).to_list(length=None)
+            extra = _extra_ids(collection_name, field, groups)
+            if extra:
+                await collection.delete_many({"_id": {"$in": extra}})
+        # One index at a time, so a failed unique build leaves the others in place
+        for index in indexes:
+            try:
+                await collection.create_indexes([index])
+            except OperationFailure as e:
+                _index_build_failed(collection_name, index, e)
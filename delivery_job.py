@@ -0,0 +1,129 @@
+"""
+Delivery schedule materialization
+
+Computes the next --count delivery dates of every subscription on or after
+--start (today, UTC, by default) and upserts them into the `delivery`
+collection, one document per (subscription_id, delivery_date). Deliveries
+fall on whole multiples of the subscription's frequency after its
+created_at date: every 7 days (weekly), every 14 days (biweekly) or on the
+same day of each later calendar month (monthly, clamped to the month's last
+day).
+
+Subscriptions are read in _id order through one server-side cursor and
+written a batch at a time, so memory use depends on --batch-size only. After
+every batch the last processed _id is stored in `job_checkpoint`; a run
+that dies resumes after it (with the original --start and --count) unless
+--restart is given. Re-running is safe: deliveries are upserted on their
+unique key and existing ones keep their status.
+
+    python delivery_job.py --count 8 --batch-size 2000
+"""
+import argparse
+import calendar
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List
+
+from database import DATABASE_NOT_AVAILABLE, ensure_indexes, get_db, iter_document_batches, update_document, update_documents_bulk
+
+logger = logging.getLogger("delivery_job")
+
+JOB_ID = "delivery_schedule"
+INTERVAL_DAYS = {"weekly": 7, "biweekly": 14}
+FREQUENCIES = ("weekly", "biweekly", "monthly")
+ITEM_FIELDS = ("meal_id", "servings", "title", "macros")
+SUBSCRIPTION_PROJECTION = {"email": 1, "frequency": 1, "items": 1, "totals": 1, "created_at": 1}
+
+
+def add_months(day: date, months: int) -> date:
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def delivery_dates(anchor: date, frequency: str, start: date, count: int) -> List[date]:
+    """The first `count` deliveries on or after `start` of a subscription created on `anchor`"""
+    if frequency == "monthly":
+        k = max(1, (start.year - anchor.year) * 12 + start.month - anchor.month)
+        if add_months(anchor, k) < start:
+            k += 1
+        return [add_months(anchor, k + i) for i in range(count)]
+    interval = INTERVAL_DAYS[frequency]
+    k = max(1, -(-(start - anchor).days // interval))
+    return [anchor + timedelta(days=interval * (k + i)) for i in range(count)]
+
+
+def _midnight(day: date) -> datetime:
+    # Mongo has no date-only type; deliveries are stored at 00:00 UTC
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def delivery_updates(subscriptions: Iterable[dict], start: date, count: int) -> list:
+    """(filter, update) pairs upserting each subscription's upcoming deliveries"""
+    updates = []
+    now = datetime.now(timezone.utc)
+    for sub in subscriptions:
+        if sub.get("frequency") not in FREQUENCIES:
+            logger.warning("subscription %s: unknown frequency %r, skipped", sub["_id"], sub.get("frequency"))
+            continue
+        anchor = (sub.get("created_at") or now).date()
+        items = [{k: item[k] for k in ITEM_FIELDS if k in item} for item in sub.get("items", [])]
+        fields = {"email": sub.get("email"), "items": items, "totals": sub.get("totals")}
+        for day in delivery_dates(anchor, sub["frequency"], start, count):
+            key = {"subscription_id": sub["_id"], "delivery_date": _midnight(day)}
+            updates.append((key, {"$set": fields, "$setOnInsert": {"status": "scheduled", "created_at": now}}))
+    return updates
+
+
+def load_checkpoint() -> dict:
+    return get_db()["job_checkpoint"].find_one({"_id": JOB_ID}) or {}
+
+
+def save_checkpoint(**fields) -> None:
+    update_document("job_checkpoint", {"_id": JOB_ID}, fields, upsert=True)
+
+
+def run(start: date, count: int, batch_size: int, restart: bool = False) -> dict:
+    ensure_indexes()
+    checkpoint = {} if restart else load_checkpoint()
+    last_id = None
+    if checkpoint.get("last_id") is not None and not checkpoint.get("completed_at"):
+        last_id = checkpoint["last_id"]
+        start = checkpoint["start"].date()
+        count = checkpoint["count"]
+        logger.info("resuming after subscription %s (start %s, count %d)", last_id, start, count)
+    else:
+        save_checkpoint(last_id=None, start=_midnight(start), count=count, completed_at=None)
+
+    totals = {"subscriptions": 0, "upserted": 0, "matched": 0}
+    started = time.perf_counter()
+    filter_dict = {"_id": {"$gt": last_id}} if last_id is not None else {}
+    for batch in iter_document_batches("subscription", filter_dict, SUBSCRIPTION_PROJECTION, batch_size):
+        result = update_documents_bulk("delivery", delivery_updates(batch, start, count), upsert=True)
+        totals["subscriptions"] += len(batch)
+        totals["upserted"] += result["upserted"]
+        totals["matched"] += result["matched"]
+        save_checkpoint(last_id=batch[-1]["_id"])
+        logger.info("%d subscriptions, %d deliveries created, %.0f subscriptions/s", totals["subscriptions"], totals["upserted"], totals["subscriptions"] / (time.perf_counter() - started))
+    save_checkpoint(completed_at=datetime.now(timezone.utc))
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=date.fromisoformat, default=datetime.now(timezone.utc).date(), help="first date to schedule (YYYY-MM-DD)")
+    parser.add_argument("--count", type=int, default=4, help="deliveries to schedule per subscription")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first subscription")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if get_db() is None:
+        parser.error(DATABASE_NOT_AVAILABLE)
+    totals = run(args.start, args.count, args.batch_size, args.restart)
+    logger.info("done: %s", totals)
+
+
+if __name__ == "__main__":
+    main()
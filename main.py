@@ -1,13 +1,87 @@
 import os
-from fastapi import FastAPI, HTTPException, Query
+import json
+import base64
+import time
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from pydantic import BaseModel, conlist, conint, confloat
+import numpy as np
+from bson import ObjectId
 
-from database import db, create_document, get_documents
-from schemas import Meal, Subscription, Preference, Macros
+from database import (
+    get_async_db,
+    close_clients,
+    async_create_documents,
+    async_create_documents_per_item,
+    async_get_documents,
+    async_find_one,
+    async_aggregate,
+    async_estimated_document_count,
+    async_ensure_indexes,
+    async_update_documents_bulk,
+    pool_stats,
+    DATABASE_NOT_AVAILABLE,
+)
+from schemas import Meal, Subscription, Preference, Macros, DietTag, CategoryType, DIET_TAGS, diet_mask
+from cache import TTLCache
+from serialization import MongoJSONResponse, MongoDocument
+import metrics
+import planner
+from catalog import CatalogSnapshot, MACRO_COLUMNS
+from batching import GroupCommitter, WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in each worker process after fork, so every worker opens its own pool
+    setup = None
+    if get_async_db() is not None and not await prepare_database():
+        # Serve anyway (GET /test reports the outage) and keep trying
+        setup = asyncio.create_task(retry_prepare_database())
+    yield
+    if setup is not None:
+        setup.cancel()
+    await subscription_commits.drain()
+    await preference_buffer.drain()
+    close_clients()
+
+# Backoff between attempts at database setup after a failed startup
+SETUP_RETRY_MIN_SECONDS = 1.0
+SETUP_RETRY_MAX_SECONDS = 60.0
+
+async def prepare_database() -> bool:
+    """Create indexes and backfill diet masks; False (logged) if the database failed"""
+    try:
+        await async_ensure_indexes()
+        await backfill_diet_masks()
+        return True
+    except Exception:
+        logger.exception("database setup failed")
+        return False
 
-app = FastAPI(title="Protein Meals API", version="1.0.0")
+async def retry_prepare_database():
+    delay = SETUP_RETRY_MIN_SECONDS
+    while True:
+        await asyncio.sleep(delay)
+        if await prepare_database():
+            logger.info("database setup succeeded after retrying")
+            return
+        delay = min(delay * 2, SETUP_RETRY_MAX_SECONDS)
+
+async def backfill_diet_masks():
+    """Store diet_mask on meals written before it existed"""
+    docs = await async_get_documents("meal", {"diet_mask": {"$exists": False}}, projection={"diet_tags": 1})
+    if docs:
+        await async_update_documents_bulk("meal", [(d["_id"], {"diet_mask": diet_mask(d.get("diet_tags"))}) for d in docs])
+        invalidate_meal_caches()
+
+app = FastAPI(title="Protein Meals API", version="1.0.0", default_response_class=MongoJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,29 +90,133 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it wraps everything, including CORS preflights
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Catalog snapshot for GET /meals, keyed by query parameters
+meal_cache = TTLCache(
+    maxsize=int(os.getenv("MEAL_CACHE_MAX_ENTRIES", "256")),
+    ttl=float(os.getenv("MEAL_CACHE_TTL_SECONDS", "30")),
+)
+
+# meal_id -> macros, in front of the portion calculators
+meal_macros_cache = TTLCache(
+    maxsize=int(os.getenv("MEAL_MACROS_CACHE_MAX_ENTRIES", "4096")),
+    ttl=float(os.getenv("MEAL_MACROS_CACHE_TTL_SECONDS", "300")),
+)
+
+def invalidate_meal_caches(meal_ids: Optional[List[str]] = None):
+    """Must be called after any write to the meal collection.
+
+    Pass the ids of the meals written to keep unrelated macro entries warm;
+    omit them when the write may have touched any meal.
+    """
+    global _catalog, _catalog_generation
+    meal_cache.clear()
+    feed_cache.clear()
+    _catalog = None
+    _catalog_generation += 1
+    if meal_ids is None:
+        meal_macros_cache.clear()
+    else:
+        for meal_id in meal_ids:
+            meal_macros_cache.invalidate(meal_id)
+
+# Column-oriented snapshot of the whole catalog, rebuilt after meal writes and
+# every CATALOG_SNAPSHOT_TTL_SECONDS (other workers' writes only expire it).
+# Catalogs above CATALOG_SNAPSHOT_MAX_MEALS are not held in memory; GET /meals
+# then queries Mongo directly.
+CATALOG_SNAPSHOT_MAX_MEALS = int(os.getenv("CATALOG_SNAPSHOT_MAX_MEALS", "50000"))
+CATALOG_SNAPSHOT_TTL_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_TTL_SECONDS", "60"))
+# Meal fields plus what the write helpers store alongside them
+CATALOG_PROJECTION = {**{f: 1 for f in Meal.model_fields}, "diet_mask": 1, "created_at": 1, "updated_at": 1}
+_catalog: Optional[tuple] = None  # (snapshot or None when too large, built_at)
+_catalog_generation = 0
+_catalog_lock = asyncio.Lock()
+
+async def get_catalog() -> Optional[CatalogSnapshot]:
+    """The current catalog snapshot, or None when the catalog is too large to hold"""
+    global _catalog
+    state = _catalog
+    if state is not None and time.monotonic() - state[1] < CATALOG_SNAPSHOT_TTL_SECONDS:
+        return state[0]
+    async with _catalog_lock:
+        if _catalog is not state and _catalog is not None:
+            return _catalog[0]
+        generation = _catalog_generation
+        snapshot = None
+        # Check the size first so an oversized catalog costs one metadata
+        # command per TTL instead of fetching and discarding 50k meals
+        if await async_estimated_document_count("meal") <= CATALOG_SNAPSHOT_MAX_MEALS:
+            docs = await async_get_documents("meal", limit=CATALOG_SNAPSHOT_MAX_MEALS + 1, projection=CATALOG_PROJECTION, sort=[("_id", 1)])
+            # The estimate can lag; the limit still keeps an oversized catalog out
+            if len(docs) <= CATALOG_SNAPSHOT_MAX_MEALS:
+                snapshot = await asyncio.to_thread(CatalogSnapshot, docs)
+        # A meal write during the build makes this snapshot stale; use it once but don't keep it
+        if generation == _catalog_generation:
+            _catalog = (snapshot, time.monotonic())
+        return snapshot
+
+# (snapshot serial, diet mask, protein bucket) -> ranked meal ids for
+# GET /feed/{email}. Users with the same diet filters and a similar target
+# share one ranking; keying on the snapshot means a rebuilt catalog (after a
+# write in any worker) is ranked afresh rather than served from old entries.
+feed_cache = TTLCache(
+    maxsize=int(os.getenv("FEED_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("FEED_CACHE_TTL_SECONDS", "300")),
+)
+FEED_PROTEIN_BUCKET_G = 10
+MEALS_PER_DAY = 3
+
+# (from, to) -> GET /reports/production response
+report_cache = TTLCache(
+    maxsize=int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "64")),
+    ttl=float(os.getenv("REPORT_CACHE_TTL_SECONDS", "300")),
+)
+MAX_REPORT_DAYS = 92
+
+CACHES = {"meals": meal_cache, "meal_macros": meal_macros_cache, "feed": feed_cache, "reports": report_cache}
+
+def _cache_samples(attr: str) -> dict:
+    return {(name,): getattr(cache, attr) for name, cache in CACHES.items()}
+
+metrics.CallbackMetric("cache_hits_total", "In-process cache hits", ("cache",), lambda: _cache_samples("hits"), kind="counter")
+metrics.CallbackMetric("cache_misses_total", "In-process cache misses", ("cache",), lambda: _cache_samples("misses"), kind="counter")
+metrics.CallbackMetric("cache_evictions_total", "In-process cache LRU evictions", ("cache",), lambda: _cache_samples("evictions"), kind="counter")
+metrics.CallbackMetric("cache_entries", "In-process cache entries", ("cache",), lambda: {(n,): len(c) for n, c in CACHES.items()})
+metrics.CallbackMetric(
+    "catalog_snapshot_meals", "Meals in the in-memory catalog snapshot", (),
+    lambda: {(): len(_catalog[0]) if _catalog and _catalog[0] is not None else 0},
+)
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Protein-focused Food Delivery Backend"}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
         "database_url": None,
         "database_name": None,
         "connection_status": "Not Connected",
-        "collections": []
+        "collections": [],
+        "pool": pool_stats(),
     }
     try:
-        if db is not None:
+        async_db = get_async_db()
+        if async_db is not None:
             response["database"] = "✅ Available"
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-            response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
+            response["database_name"] = async_db.name if hasattr(async_db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await async_db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -63,73 +241,538 @@ INITIAL_MEALS: List[Meal] = [
 ]
 
 @app.post("/seed")
-def seed():
+async def seed():
     try:
-        existing = db["meal"].count_documents({}) if db is not None else 0
-        if existing == 0:
-            for m in INITIAL_MEALS:
-                create_document("meal", m)
-            return {"seeded": True, "count": len(INITIAL_MEALS)}
-        return {"seeded": False, "count": existing}
+        # Upserts keyed on the unique title index make concurrent seeds safe
+        result = await async_create_documents("meal", INITIAL_MEALS, key="title")
+        inserted = len(result["inserted_ids"])
+        if inserted:
+            invalidate_meal_caches()
+        return {"seeded": inserted > 0, "count": len(INITIAL_MEALS), "inserted": inserted}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Pagination for GET /meals
+MEAL_FIELDS = set(Meal.model_fields)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(values: list) -> str:
+    """Opaque, URL-safe page cursor holding the sort key of the last item"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or not values:
+            raise ValueError(cursor)
+        return values
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str]) -> Optional[tuple]:
+    """Validate a comma separated `fields=` projection against the Meal schema"""
+    if not fields:
+        return None
+    names = tuple(sorted({f.strip() for f in fields.split(",") if f.strip()}))
+    unknown = [f for f in names if f not in MEAL_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+def parse_diets(diets: Optional[str]) -> tuple:
+    """Validate a comma separated `diets=` list against DietTag"""
+    if not diets:
+        return ()
+    tags = tuple(sorted({t.strip() for t in diets.split(",") if t.strip()}))
+    unknown = [t for t in tags if t not in DIET_TAGS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown diets: {', '.join(unknown)}")
+    return tags
+
+def project_meal(doc: dict, field_names: Optional[tuple]) -> dict:
+    """A snapshot document limited to `fields=` (snapshot documents are shared, never mutated)"""
+    if not field_names:
+        return doc
+    projected = MongoDocument(_id=doc["_id"])
+    for f in field_names:
+        if f in doc:
+            projected[f] = doc[f]
+    return projected
+
+MONGO_SORTS = {
+    "id": [("_id", 1)],
+    "protein": [("macros.protein", 1), ("_id", 1)],
+}
+
 @app.get("/meals")
-def list_meals(
+async def list_meals(
     category: Optional[str] = Query(None),
     diet: Optional[str] = Query(None),
     min_protein: Optional[float] = Query(None, ge=0),
+    diets: Optional[str] = Query(None, description="Comma separated diet tags, e.g. vegan,gluten-free"),
+    match: Literal["all", "any"] = Query("all", description="Whether meals need all or any of `diets`"),
+    sort: Optional[Literal["id", "protein", "protein_per_dollar"]] = Query(None, description="Defaults to protein when min_protein is set, else id"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
 ):
+    field_names = parse_fields(fields)
+    diet_tags = parse_diets(diets)
+    sort = sort or ("protein" if min_protein is not None else "id")
+    cursor_values = decode_cursor(after) if after else None
+    if cursor_values and (
+        len(cursor_values) != (1 if sort == "id" else 2)
+        or not isinstance(cursor_values[-1], str)
+        or (sort != "id" and not isinstance(cursor_values[0], (int, float)))
+    ):
+        raise HTTPException(status_code=400, detail="Cursor does not match sort")
+    if cursor_values and not ObjectId.is_valid(cursor_values[-1]):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    cache_key = (category, diet, diet_tags, match, min_protein, sort, limit, after, field_names)
+    cached = meal_cache.get(cache_key)
+    if cached is not None:
+        return MongoJSONResponse(cached)
     try:
-        filter_dict = {}
-        if category:
-            filter_dict["category"] = category
-        if diet:
-            filter_dict["diet_tags"] = {"$in": [diet]}
-        meals = get_documents("meal", filter_dict)
-        # Basic protein filter
-        if min_protein is not None:
-            meals = [m for m in meals if m.get("macros", {}).get("protein", 0) >= min_protein]
-        # Transform ObjectId to string
-        for m in meals:
-            if "_id" in m:
-                m["id"] = str(m.pop("_id"))
-        return {"items": meals}
+        catalog = await get_catalog()
+        if catalog is not None:
+            mask = catalog.select(category=category, diet=diet, diets=diet_tags, match=match, min_protein=min_protein)
+            rows, key = catalog.page(mask, sort, cursor_values, limit)
+            meals = [project_meal(catalog.docs[row], field_names) for row in rows.tolist()]
+            next_cursor = encode_cursor(key) if key else None
+        else:
+            meals, next_cursor = await query_meals(category, diet, diet_tags, match, min_protein, sort, limit, cursor_values, field_names)
+        # MongoJSONResponse renders _id as a string id
+        response = {"items": meals, "next_cursor": next_cursor}
+        meal_cache.set(cache_key, response)
+        return MongoJSONResponse(response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def query_meals(category, diet, diet_tags, match, min_protein, sort, limit, cursor_values, field_names):
+    """GET /meals against Mongo, for catalogs too large for the snapshot"""
+    if sort not in MONGO_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort={sort} needs the in-memory catalog")
+    filter_dict = {}
+    if category:
+        filter_dict["category"] = category
+    if diet:
+        filter_dict["diet_tags"] = {"$in": [diet]}
+    if diet_tags:
+        operator = "$bitsAnySet" if match == "any" else "$bitsAllSet"
+        filter_dict["diet_mask"] = {operator: diet_mask(diet_tags)}
+    if min_protein is not None:
+        filter_dict["macros.protein"] = {"$gte": min_protein}
+    # Protein-ordered pages walk the macros.protein indexes
+    by_protein = sort == "protein"
+    if cursor_values:
+        last_id = ObjectId(cursor_values[-1])
+        if by_protein:
+            last_protein = cursor_values[0]
+            filter_dict["$or"] = [
+                {"macros.protein": {"$gt": last_protein}},
+                {"macros.protein": last_protein, "_id": {"$gt": last_id}},
+            ]
+        else:
+            filter_dict["_id"] = {"$gt": last_id}
+    projection = None
+    if field_names:
+        projection = {f: 1 for f in field_names}
+        if by_protein and "macros" not in projection:
+            projection["macros.protein"] = 1
+    # Fetch one extra row to learn whether another page exists
+    meals = await async_get_documents("meal", filter_dict, limit=limit + 1, projection=projection, sort=MONGO_SORTS[sort])
+    next_cursor = None
+    if len(meals) > limit:
+        meals = meals[:limit]
+        last = meals[-1]
+        key = [last["macros"]["protein"], str(last["_id"])] if by_protein else [str(last["_id"])]
+        next_cursor = encode_cursor(key)
+    if field_names and "macros" not in field_names:
+        for m in meals:
+            m.pop("macros", None)
+    return meals, next_cursor
+
+@app.get("/meals/cache")
+async def meal_cache_stats():
+    return {"meals": meal_cache.stats(), "macros": meal_macros_cache.stats(), "feed": feed_cache.stats()}
+
 class PortionRequest(BaseModel):
     meal_id: str
     servings: float = 1.0
 
-@app.post("/meals/portion")
-def get_portion_macros(req: PortionRequest):
+class PortionBatchRequest(BaseModel):
+    items: conlist(PortionRequest, min_length=1, max_length=100)
+
+MIN_PORTION = 0.25
+
+def portion_factors(servings) -> np.ndarray:
+    return np.maximum(MIN_PORTION, np.asarray(servings, dtype=float))
+
+def macros_dict(values) -> dict:
+    return {k: round(float(v), 1) for k, v in zip(MACRO_COLUMNS, values)}
+
+async def get_meal_macros(meal_ids: List[str]) -> dict:
+    """Resolve meal_id -> macros from meal_macros_cache, with one $in query for misses.
+
+    Unknown ids are absent from the result; malformed ids raise a 400.
+    """
+    from bson.errors import InvalidId
+    found = {}
+    misses = {}
+    for meal_id in meal_ids:
+        macros = meal_macros_cache.get(meal_id)
+        if macros is not None:
+            found[meal_id] = macros
+            continue
+        try:
+            misses[meal_id] = ObjectId(meal_id)
+        except InvalidId as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if misses:
+        try:
+            docs = await async_get_documents("meal", {"_id": {"$in": list(misses.values())}}, projection={"macros": 1})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        for d in docs:
+            meal_id = str(d["_id"])
+            found[meal_id] = d.get("macros", {})
+            meal_macros_cache.set(meal_id, found[meal_id])
+    return found
+
+async def lookup_macros(meal_ids: List[str]) -> np.ndarray:
+    """Macro rows for `meal_ids`, shape (len(meal_ids), len(MACRO_COLUMNS)).
+
+    Reads the catalog snapshot; ids it doesn't have (too large, or newer than
+    the snapshot) go through get_meal_macros. Unknown ids raise a 404.
+    """
+    result = np.zeros((len(meal_ids), len(MACRO_COLUMNS)))
+    rows = np.full(len(meal_ids), -1)
     try:
-        from bson import ObjectId
-        doc = db["meal"].find_one({"_id": ObjectId(req.meal_id)})
-        if not doc:
-            raise HTTPException(status_code=404, detail="Meal not found")
-        macros = doc.get("macros", {})
-        factor = max(0.25, float(req.servings))
-        scaled = {k: round(v * factor, 1) for k, v in macros.items()}
-        return {"servings": factor, "macros": scaled}
+        catalog = await get_catalog()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if catalog is not None:
+        rows = catalog.rows_for(meal_ids)
+        found = rows >= 0
+        result[found] = catalog.macros[:, rows[found]].T
+    unresolved = np.flatnonzero(rows < 0).tolist()
+    if unresolved:
+        macros_by_id = await get_meal_macros(list(dict.fromkeys(meal_ids[i] for i in unresolved)))
+        missing = list(dict.fromkeys(meal_ids[i] for i in unresolved if meal_ids[i] not in macros_by_id))
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Meal not found: {', '.join(missing)}")
+        for i in unresolved:
+            macros = macros_by_id[meal_ids[i]]
+            result[i] = [macros.get(k, 0.0) for k in MACRO_COLUMNS]
+    return result
+
+@app.post("/meals/portion")
+async def get_portion_macros(req: PortionRequest):
+    macros = await lookup_macros([req.meal_id])
+    factor = float(portion_factors(req.servings))
+    return MongoJSONResponse({"servings": factor, "macros": macros_dict(macros[0] * factor)})
+
+@app.post("/meals/portion/batch")
+async def get_portion_macros_batch(req: PortionBatchRequest):
+    meal_ids = [item.meal_id for item in req.items]
+    factors = portion_factors([item.servings for item in req.items])
+    # One lookup for every line item, then the whole cart is scaled at once
+    scaled = await lookup_macros(meal_ids) * factors[:, None]
+    items = [
+        {"meal_id": meal_id, "servings": float(factor), "macros": macros_dict(row)}
+        for meal_id, factor, row in zip(meal_ids, factors, scaled)
+    ]
+    return MongoJSONResponse({"items": items, "totals": macros_dict(scaled.sum(axis=0))})
+
+async def lookup_meals(meal_ids: List[str]) -> dict:
+    """meal_id -> {title, price, macros} from the catalog snapshot, with one $in query for the rest.
+
+    Unknown and malformed ids are absent from the result.
+    """
+    from bson.errors import InvalidId
+    found = {}
+    catalog = await get_catalog()
+    misses = {}
+    for meal_id in dict.fromkeys(meal_ids):
+        row = catalog.row_of.get(meal_id) if catalog is not None else None
+        if row is not None:
+            d = catalog.docs[row]
+            found[meal_id] = {"title": d.get("title"), "price": d.get("price", 0.0), "macros": d.get("macros") or {}}
+            continue
+        try:
+            misses[meal_id] = ObjectId(meal_id)
+        except InvalidId:
+            pass
+    if misses:
+        docs = await async_get_documents("meal", {"_id": {"$in": list(misses.values())}}, projection={"title": 1, "price": 1, "macros": 1})
+        for d in docs:
+            found[str(d["_id"])] = {"title": d.get("title"), "price": d.get("price", 0.0), "macros": d.get("macros") or {}}
+    return found
+
+def unknown_meals(sub: Subscription, meals: dict) -> List[str]:
+    return list(dict.fromkeys(item.meal_id for item in sub.items if item.meal_id not in meals))
+
+def subscription_document(sub: Subscription, meals: dict) -> dict:
+    """The stored subscription: each item carries its meal's title, price and
+    scaled macros, plus per-delivery totals, so delivery and billing jobs
+    never join back against `meal`. Prices are as of signup.
+    """
+    doc = sub.model_dump()
+    totals = np.zeros(len(MACRO_COLUMNS))
+    total_price = 0.0
+    for item in doc["items"]:
+        meal = meals[item["meal_id"]]
+        macros = np.array([meal["macros"].get(k, 0.0) for k in MACRO_COLUMNS]) * item["servings"]
+        price = meal["price"] * item["servings"]
+        item.update(title=meal["title"], unit_price=meal["price"], price=round(price, 2), macros=macros_dict(macros))
+        totals += macros
+        total_price += price
+    doc["totals"] = {"price": round(total_price, 2), "macros": macros_dict(totals)}
+    return doc
+
+async def commit_subscriptions(items: list) -> list:
+    return await async_create_documents_per_item("subscription", items)
+
+# Concurrent signups share one insert_many; each request still waits for its own write
+subscription_commits = GroupCommitter(
+    "subscription",
+    commit_subscriptions,
+    max_batch=int(os.getenv("SUBSCRIPTION_COMMIT_MAX_BATCH", "200")),
+    max_wait=float(os.getenv("SUBSCRIPTION_COMMIT_MAX_WAIT_SECONDS", "0.003")),
+)
 
 @app.post("/subscriptions")
-def create_subscription(payload: Subscription):
+async def create_subscription(payload: Subscription):
+    try:
+        meals = await lookup_meals([item.meal_id for item in payload.items])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    missing = unknown_meals(payload, meals)
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Meal not found: {', '.join(missing)}")
     try:
-        sub_id = create_document("subscription", payload)
+        sub_id = await subscription_commits.submit(subscription_document(payload, meals))
         return {"id": sub_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class SubscriptionBatchRequest(BaseModel):
+    items: conlist(Subscription, min_length=1, max_length=1000)
+
+@app.post("/subscriptions/batch")
+async def create_subscriptions_batch(req: SubscriptionBatchRequest):
+    """Partner imports: one meal lookup and one insert_many, with a per-item id or error in input order"""
+    try:
+        meals = await lookup_meals([item.meal_id for sub in req.items for item in sub.items])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    items: List[dict] = [{} for _ in req.items]
+    valid = []
+    for i, sub in enumerate(req.items):
+        missing = unknown_meals(sub, meals)
+        if missing:
+            items[i] = {"error": f"Meal not found: {', '.join(missing)}"}
+        else:
+            valid.append(i)
+    try:
+        results = await async_create_documents_per_item("subscription", [subscription_document(req.items[i], meals) for i in valid])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    for i, r in zip(valid, results):
+        items[i] = {"error": str(r)} if isinstance(r, Exception) else {"id": r}
+    return {"inserted": sum("id" in item for item in items), "items": items}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def newer_preference_update(fields: dict) -> list:
+    """Pipeline update applying `fields` only if its requested_at is newer than the stored one.
+
+    Each worker buffers and flushes on its own schedule, so a slider burst
+    spread over workers can reach Mongo out of order; the stored
+    requested_at decides which write wins.
+    """
+    newer = {"$lt": [{"$ifNull": ["$requested_at", EPOCH]}, fields["requested_at"]]}
+    merged = {"$mergeObjects": ["$$ROOT", {"$literal": {**fields, "updated_at": datetime.now(timezone.utc)}}]}
+    return [{"$replaceWith": {"$cond": [newer, merged, "$$ROOT"]}}]
+
+async def flush_preferences(batch: dict):
+    # upsert by email, one bulk_write per flush
+    await async_update_documents_bulk("preference", [({"email": email}, newer_preference_update(fields)) for email, fields in batch.items()], upsert=True)
+
+# Sliders send a burst of updates per email; only the latest one is written
+preference_buffer = WriteBehindBuffer(
+    "preference",
+    flush_preferences,
+    max_batch=int(os.getenv("PREFERENCE_BUFFER_MAX_BATCH", "500")),
+    max_delay=float(os.getenv("PREFERENCE_BUFFER_MAX_DELAY_SECONDS", "0.25")),
+    max_pending=int(os.getenv("PREFERENCE_BUFFER_MAX_PENDING", "10000")),
+)
+
 @app.post("/preferences")
-def upsert_preferences(pref: Preference):
+async def upsert_preferences(pref: Preference):
+    if get_async_db() is None:
+        raise HTTPException(status_code=500, detail=DATABASE_NOT_AVAILABLE)
+    try:
+        preference_buffer.put(pref.email, {**pref.model_dump(), "requested_at": datetime.now(timezone.utc)})
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"status": "ok"}
+
+
+class PlanRequest(BaseModel):
+    target_protein_g_per_day: confloat(ge=20, le=400)
+    diet_filters: List[DietTag] = []
+    categories: Optional[List[CategoryType]] = None
+    objective: Literal["price", "calories"] = "price"
+    max_meals: conint(ge=1, le=20) = 6
+    max_servings_per_meal: confloat(ge=planner.MIN_SERVINGS, le=planner.MAX_SERVINGS) = planner.MAX_SERVINGS
+
+@app.post("/plans/optimize")
+async def optimize_plan(req: PlanRequest):
+    try:
+        catalog = await get_catalog()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if catalog is None:
+        raise HTTPException(status_code=503, detail="Catalog too large for in-memory planning")
+    mask = catalog.select(diets=req.diet_filters, categories=req.categories)
+    # A few milliseconds of NumPy work on large catalogs; keep it off the event loop
+    plan = await asyncio.to_thread(
+        planner.optimize,
+        catalog,
+        req.target_protein_g_per_day,
+        mask,
+        objective=req.objective,
+        max_meals=req.max_meals,
+        max_servings=req.max_servings_per_meal,
+    )
+    rows, servings = plan["rows"], plan["servings"]
+    # Scale every chosen row at once, then emit plain floats
+    scaled = catalog.scale(rows, servings)
+    cost = catalog.price[rows] * servings
+    items = [
+        {
+            "meal_id": catalog.ids[row],
+            "title": catalog.docs[row].get("title"),
+            "servings": float(servings[i]),
+            "price": round(float(cost[i]), 2),
+            "macros": macros_dict(scaled[i]),
+        }
+        for i, row in enumerate(rows.tolist())
+    ]
+    totals = macros_dict(scaled.sum(axis=0))
+    totals["price"] = round(float(cost.sum()), 2)
+    return MongoJSONResponse({
+        "feasible": plan["feasible"],
+        "objective": req.objective,
+        "target_protein_g_per_day": req.target_protein_g_per_day,
+        "items": items,
+        "totals": totals,
+    })
+
+@app.get("/feed/{email}")
+async def personalized_feed(email: str, limit: int = Query(20, ge=1, le=100)):
     try:
-        # upsert by email
-        db["preference"].update_one({"email": pref.email}, {"$set": pref.model_dump()}, upsert=True)
-        return {"status": "ok"}
+        # A buffered update is newer than whatever is stored
+        doc = preference_buffer.get(email)
+        if doc is None:
+            doc = await async_find_one("preference", {"email": email}, {"_id": 0, "target_protein_g_per_day": 1, "diet_filters": 1})
+        catalog = await get_catalog()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    # Users without stored preferences get the defaults
+    defaults = Preference.model_fields
+    target = (doc or {}).get("target_protein_g_per_day", defaults["target_protein_g_per_day"].default)
+    diets = (doc or {}).get("diet_filters") or []
+    if catalog is None:
+        raise HTTPException(status_code=503, detail="Catalog too large for in-memory ranking")
+
+    bucket = max(1, round(target / FEED_PROTEIN_BUCKET_G))
+    key = (catalog.serial, diet_mask(diets), bucket)
+    ranked = feed_cache.get(key)
+    if ranked is None:
+        mask = catalog.select(diets=diets)
+        rows = catalog.rank_by_protein_fit(mask, bucket * FEED_PROTEIN_BUCKET_G / MEALS_PER_DAY)
+        ranked = [catalog.ids[row] for row in rows.tolist()]
+        feed_cache.set(key, ranked)
 
+    items = [catalog.docs[catalog.row_of[meal_id]] for meal_id in ranked if meal_id in catalog.row_of][:limit]
+    return MongoJSONResponse({
+        "email": email,
+        "target_protein_g_per_day": target,
+        "diet_filters": diets,
+        "items": items,
+    })
+
+
+def production_pipeline(start: datetime, end: datetime) -> list:
+    """Servings and macros due per (delivery date, meal) for deliveries in [start, end).
+
+    Deliveries carry each item's title and servings-scaled macros (copied
+    from the subscription), so no $lookup against `meal` is needed.
+    """
+    sums = {k: {"$sum": f"$items.macros.{k}"} for k in MACRO_COLUMNS}
+    return [
+        {"$match": {"delivery_date": {"$gte": start, "$lt": end}}},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {"date": "$delivery_date", "meal_id": "$items.meal_id"},
+            "title": {"$first": "$items.title"},
+            "servings": {"$sum": "$items.servings"},
+            "deliveries": {"$sum": 1},
+            **sums,
+        }},
+        {"$sort": {"_id.date": 1, "_id.meal_id": 1}},
+        {"$project": {
+            "_id": 0,
+            "date": "$_id.date",
+            "meal_id": "$_id.meal_id",
+            "title": 1,
+            "servings": 1,
+            "deliveries": 1,
+            **{k: 1 for k in MACRO_COLUMNS},
+        }},
+    ]
+
+@app.get("/reports/production")
+async def production_report(
+    from_: date = Query(..., alias="from"),
+    to: date = Query(..., description="Last day included"),
+):
+    if to < from_:
+        raise HTTPException(status_code=400, detail="'to' is before 'from'")
+    if (to - from_).days >= MAX_REPORT_DAYS:
+        raise HTTPException(status_code=400, detail=f"Report range is limited to {MAX_REPORT_DAYS} days")
+    key = (from_, to)
+    cached = report_cache.get(key)
+    if cached is not None:
+        return MongoJSONResponse(cached)
+
+    start = datetime(from_.year, from_.month, from_.day, tzinfo=timezone.utc)
+    end = start + timedelta(days=(to - from_).days + 1)
+    try:
+        rows = await async_aggregate("delivery", production_pipeline(start, end))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    days = {}
+    for row in rows:
+        day = row["date"].date().isoformat()
+        days.setdefault(day, []).append({
+            "meal_id": row["meal_id"],
+            "title": row.get("title"),
+            "servings": round(row["servings"], 2),
+            "deliveries": row["deliveries"],
+            "macros": macros_dict([row.get(k, 0.0) for k in MACRO_COLUMNS]),
+        })
+    result = {
+        "from": from_.isoformat(),
+        "to": to.isoformat(),
+        "days": [{"date": day, "meals": meals} for day, meals in days.items()],
+    }
+    report_cache.set(key, result)
+    return MongoJSONResponse(result)
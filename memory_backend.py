@@ -0,0 +1,888 @@
+"""
+In-process MongoDB stand-in
+
+Implements the subset of the pymongo/Motor API that this service uses so the
+API, benchmarks and load tests can run without a Mongo server. Selected with
+DATABASE_BACKEND=memory (see settings.MongoSettings); database.py then hands
+out MemoryClient / AsyncMemoryClient instead of the real drivers.
+
+Supported: insert_one/insert_many, find (filters, projection, sort, skip,
+limit), find_one, update_one/update_many with upsert, delete_one/delete_many,
+count_documents, bulk_write, create_index(es) with unique enforcement, and
+aggregate with $match/$unwind/$group/$sort/$project/$limit stages.
+
+Filters understand dotted paths, array membership, $eq/$ne/$gt/$gte/$lt/$lte,
+$in/$nin/$all/$exists, $bitsAllSet/$bitsAnySet and $and/$or/$nor. Updates
+understand $set/$setOnInsert/$unset/$inc/$push/$addToSet, plus pipeline
+updates with $set/$addFields/$unset/$replaceWith/$replaceRoot stages.
+Expressions are field paths ("$a.b"), "$$ROOT", literals, documents of those
+and $literal/$cond/$ifNull/$mergeObjects/$eq/$ne/$gt/$gte/$lt/$lte; $group
+accumulates with $sum/$avg/$min/$max/$first/$last/$push. Results and errors are the
+real pymongo result and exception classes.
+
+Data lives in the process and is lost on exit; every worker process has its
+own store.
+"""
+import copy
+import threading
+from typing import Any, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+
+
+# -----------------------------------------------------------------------------
+# Document helpers
+# -----------------------------------------------------------------------------
+
+def _copy(value: Any, document_class=dict) -> Any:
+    """Deep copy, turning every embedded document into `document_class`"""
+    if isinstance(value, dict):
+        return document_class((k, _copy(v, document_class)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_copy(v, document_class) for v in value]
+    return copy.copy(value)
+
+
+def _get_path(doc: Any, path: str) -> Any:
+    """Resolve a dotted path; traverses arrays of documents like MongoDB does"""
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list):
+            if part.isdigit():
+                index = int(part)
+                value = value[index] if index < len(value) else _MISSING
+            else:
+                values = [_get_path(v, part) for v in value if isinstance(v, dict)]
+                values = [v for v in values if v is not _MISSING]
+                value = values if values else _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _set_path(doc: dict, path: str, value: Any) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        child = doc.get(part)
+        if not isinstance(child, dict):
+            child = doc[part] = {}
+        doc = child
+    doc[parts[-1]] = value
+
+
+def _unset_path(doc: dict, path: str) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable form of a value, for unique index keys"""
+    if isinstance(value, dict):
+        return tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# MongoDB's cross-type sort order (subset)
+_TYPE_ORDER = [
+    (type(None), 1), (bool, 8), (int, 2), (float, 2), (str, 3), (dict, 4), (list, 5), (ObjectId, 7),
+]
+
+
+def _type_rank(value: Any) -> int:
+    if value is _MISSING:
+        return 1
+    for kind, rank in _TYPE_ORDER:
+        if isinstance(value, kind):
+            return rank
+    return 9
+
+
+def _sort_key(value: Any):
+    rank = _type_rank(value)
+    if value is _MISSING or value is None:
+        return (rank, 0)
+    if isinstance(value, (dict, list)):
+        return (rank, repr(value))
+    return (rank, value)
+
+
+# -----------------------------------------------------------------------------
+# Query matching
+# -----------------------------------------------------------------------------
+
+def _compare(op: str, value: Any, operand: Any) -> bool:
+    if value is _MISSING or value is None or operand is None:
+        return False
+    try:
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+        if op == "$lt":
+            return value < operand
+        return value <= operand
+    except TypeError:
+        return False
+
+
+def _candidates(value: Any) -> list:
+    """A field value plus, for arrays, each element (array membership semantics)"""
+    if isinstance(value, list):
+        return [value] + value
+    return [value]
+
+
+def _match_operator(value: Any, op: str, operand: Any) -> bool:
+    if op == "$eq":
+        return any(v == operand for v in _candidates(value)) if value is not _MISSING else operand is None
+    if op == "$ne":
+        return not _match_operator(value, "$eq", operand)
+    if op in ("$gt", "$gte", "$lt", "$lte"):
+        return any(_compare(op, v, operand) for v in _candidates(value))
+    if op == "$in":
+        return any(_match_operator(value, "$eq", o) for o in operand)
+    if op == "$nin":
+        return not _match_operator(value, "$in", operand)
+    if op == "$all":
+        return isinstance(value, list) and all(o in value for o in operand)
+    if op == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if op in ("$bitsAllSet", "$bitsAnySet"):
+        if isinstance(value, bool) or not isinstance(value, int):
+            return False
+        mask = operand if isinstance(operand, int) else sum(1 << bit for bit in operand)
+        return (value & mask) == mask if op == "$bitsAllSet" else (value & mask) != 0
+    if op == "$not":
+        return not _match_condition(value, operand)
+    if op == "$size":
+        return isinstance(value, list) and len(value) == operand
+    if op == "$elemMatch":
+        return isinstance(value, list) and any(
+            matches(v, operand) if isinstance(v, dict) else _match_condition(v, operand) for v in value
+        )
+    raise OperationFailure(f"unknown operator: {op}")
+
+
+def _match_condition(value: Any, condition: Any) -> bool:
+    if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+        return all(_match_operator(value, op, operand) for op, operand in condition.items())
+    return _match_operator(value, "$eq", condition)
+
+
+def matches(doc: dict, query: Optional[dict]) -> bool:
+    """Whether `doc` satisfies a MongoDB query document"""
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            if not all(matches(doc, q) for q in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, q) for q in condition):
+                return False
+        elif not _match_condition(_get_path(doc, key), condition):
+            return False
+    return True
+
+
+# -----------------------------------------------------------------------------
+# Projection and updates
+# -----------------------------------------------------------------------------
+
+def project(doc: dict, projection: Optional[dict], document_class=dict) -> dict:
+    if not projection:
+        return _copy(doc, document_class)
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    include_id = bool(projection.get("_id", 1))
+    if fields and all(bool(v) for v in fields.values()):
+        result = document_class()
+        if include_id and "_id" in doc:
+            result["_id"] = doc["_id"]
+        for path in fields:
+            value = _get_path(doc, path)
+            if value is not _MISSING:
+                _set_path(result, path, value)
+        return _copy(result, document_class)
+    result = _copy(doc, document_class)
+    for path, keep in fields.items():
+        if not keep:
+            _unset_path(result, path)
+    if not include_id:
+        result.pop("_id", None)
+    return result
+
+
+def _apply_pipeline_update(doc: dict, pipeline: list) -> None:
+    """Update with an aggregation pipeline ($set/$addFields/$unset/$replaceWith/$replaceRoot)"""
+    _id = doc.get("_id")
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name in ("$set", "$addFields"):
+            values = {path: _evaluate(doc, expr) for path, expr in spec.items()}
+            for path, value in values.items():
+                _set_path(doc, path, value)
+        elif name == "$unset":
+            for path in [spec] if isinstance(spec, str) else spec:
+                _unset_path(doc, path)
+        elif name in ("$replaceWith", "$replaceRoot"):
+            replacement = _evaluate(doc, spec["newRoot"] if name == "$replaceRoot" else spec)
+            doc.clear()
+            doc.update(replacement)
+        else:
+            raise OperationFailure(f"unsupported pipeline update stage: {name}")
+    if _id is not None:
+        doc["_id"] = _id
+
+
+def _apply_update(doc: dict, update: dict, inserting: bool) -> None:
+    if isinstance(update, list):
+        _apply_pipeline_update(doc, update)
+        return
+    if not any(k.startswith("$") for k in update):
+        # Replacement document keeps only the _id
+        _id = doc.get("_id")
+        doc.clear()
+        doc.update(_copy(update))
+        if _id is not None:
+            doc["_id"] = _id
+        return
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            if op in ("$set", "$setOnInsert"):
+                _set_path(doc, path, _copy(value))
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                current = _get_path(doc, path)
+                _set_path(doc, path, (0 if current is _MISSING else current) + value)
+            elif op in ("$push", "$addToSet"):
+                current = _get_path(doc, path)
+                items = current if isinstance(current, list) else []
+                values = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                for v in values:
+                    if op == "$push" or v not in items:
+                        items.append(_copy(v))
+                _set_path(doc, path, items)
+            else:
+                raise OperationFailure(f"unknown update operator: {op}")
+
+
+def _upsert_seed(query: dict) -> dict:
+    """Equality fields of a filter become the base of an upserted document"""
+    doc = {}
+    for key, condition in query.items():
+        if key.startswith("$"):
+            continue
+        if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            if "$eq" in condition:
+                _set_path(doc, key, _copy(condition["$eq"]))
+            continue
+        _set_path(doc, key, _copy(condition))
+    return doc
+
+
+# -----------------------------------------------------------------------------
+# Aggregation
+# -----------------------------------------------------------------------------
+
+_EXPRESSION_COMPARISONS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+
+def _evaluate(doc: dict, expr: Any) -> Any:
+    if expr == "$$ROOT":
+        return _copy(doc)
+    if isinstance(expr, str) and expr.startswith("$"):
+        value = _get_path(doc, expr[1:])
+        return None if value is _MISSING else value
+    if isinstance(expr, dict):
+        if any(k.startswith("$") for k in expr):
+            (op, args), = expr.items()
+            return _evaluate_operator(doc, op, args)
+        return {k: _evaluate(doc, v) for k, v in expr.items()}
+    if isinstance(expr, list):
+        return [_evaluate(doc, v) for v in expr]
+    return expr
+
+
+def _evaluate_operator(doc: dict, op: str, args: Any) -> Any:
+    if op == "$literal":
+        return _copy(args)
+    if op == "$cond":
+        if isinstance(args, dict):
+            args = [args["if"], args["then"], args["else"]]
+        condition, then, otherwise = args
+        return _evaluate(doc, then if _evaluate(doc, condition) else otherwise)
+    if op == "$ifNull":
+        *values, fallback = args
+        for value in values:
+            value = _evaluate(doc, value)
+            if value is not None:
+                return value
+        return _evaluate(doc, fallback)
+    if op in _EXPRESSION_COMPARISONS:
+        # Expressions compare across types in BSON order, missing/null lowest
+        left, right = (_sort_key(_evaluate(doc, a)) for a in args)
+        return _EXPRESSION_COMPARISONS[op](left, right)
+    if op == "$mergeObjects":
+        merged = {}
+        for value in args:
+            value = _evaluate(doc, value)
+            if isinstance(value, dict):
+                merged.update(value)
+        return merged
+    raise OperationFailure(f"unsupported expression operator: {op}")
+
+
+def _accumulate(op: str, values: list) -> Any:
+    if op == "$sum":
+        return sum(v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool))
+    if op == "$avg":
+        numbers = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        return sum(numbers) / len(numbers) if numbers else None
+    present = [v for v in values if v is not None]
+    if op == "$min":
+        return min(present, key=_sort_key, default=None)
+    if op == "$max":
+        return max(present, key=_sort_key, default=None)
+    if op == "$first":
+        return values[0] if values else None
+    if op == "$last":
+        return values[-1] if values else None
+    if op == "$push":
+        return list(values)
+    raise OperationFailure(f"unsupported accumulator: {op}")
+
+
+def _unwind(docs: list, spec: Any) -> list:
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    keep_empty = spec.get("preserveNullAndEmptyArrays", False)
+    result = []
+    for doc in docs:
+        value = _get_path(doc, path)
+        if isinstance(value, list) and value:
+            for element in value:
+                unwound = _copy(doc)
+                _set_path(unwound, path, element)
+                result.append(unwound)
+        elif value is not _MISSING and value is not None and not isinstance(value, list):
+            result.append(doc)
+        elif keep_empty:
+            unwound = _copy(doc)
+            _unset_path(unwound, path)
+            result.append(unwound)
+    return result
+
+
+def _group(docs: list, spec: dict) -> list:
+    groups = {}  # frozen key -> (_id, [docs])
+    for doc in docs:
+        key = _evaluate(doc, spec["_id"])
+        groups.setdefault(_freeze(key), (key, []))[1].append(doc)
+    result = []
+    for key, members in groups.values():
+        out = {"_id": key}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (op, expr), = accumulator.items()
+            out[field] = _accumulate(op, [_evaluate(d, expr) for d in members])
+        result.append(out)
+    return result
+
+
+def _project_stage(doc: dict, spec: dict) -> dict:
+    """$project: 1/0 flags behave like a find() projection; other values are expressions"""
+    fields = {k: v for k, v in spec.items() if k != "_id"}
+    id_spec = spec.get("_id", 1)
+    if isinstance(id_spec, (bool, int)) and all(isinstance(v, (bool, int)) for v in fields.values()):
+        return project(doc, spec)
+    result = {}
+    if not isinstance(id_spec, (bool, int)):
+        result["_id"] = _evaluate(doc, id_spec)
+    elif id_spec and "_id" in doc:
+        result["_id"] = doc["_id"]
+    for field, value in fields.items():
+        if isinstance(value, (bool, int)):
+            found = _get_path(doc, field)
+            if value and found is not _MISSING:
+                _set_path(result, field, found)
+        else:
+            _set_path(result, field, _evaluate(doc, value))
+    return result
+
+
+def aggregate(docs: list, pipeline: list) -> list:
+    """Run `pipeline` over copies of `docs`"""
+    docs = [_copy(d) for d in docs]
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            docs = [d for d in docs if matches(d, spec)]
+        elif name == "$unwind":
+            docs = _unwind(docs, spec)
+        elif name == "$group":
+            docs = _group(docs, spec)
+        elif name == "$sort":
+            for key, direction in reversed(list(spec.items())):
+                docs.sort(key=lambda d, k=key: _sort_key(_get_path(d, k)), reverse=direction < 0)
+        elif name == "$project":
+            docs = [_project_stage(d, spec) for d in docs]
+        elif name == "$limit":
+            docs = docs[:spec]
+        else:
+            raise OperationFailure(f"unsupported aggregation stage: {name}")
+    return docs
+
+
+# -----------------------------------------------------------------------------
+# Sync API
+# -----------------------------------------------------------------------------
+
+class MemoryCursor:
+    """Lazily evaluated find() cursor supporting sort/skip/limit chaining"""
+
+    def __init__(self, collection: "MemoryCollection", query: Optional[dict], projection: Optional[dict]):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort: List[tuple] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction: int = 1) -> "MemoryCursor":
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def skip(self, count: int) -> "MemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int) -> "MemoryCursor":
+        return self
+
+    def _evaluate(self) -> list:
+        with self._collection._lock:
+            docs = [d for d in self._collection._docs.values() if matches(d, self._query)]
+            for key, direction in reversed(self._sort):
+                docs.sort(key=lambda d, k=key: _sort_key(_get_path(d, k)), reverse=direction < 0)
+            docs = docs[self._skip:]
+            if self._limit:
+                docs = docs[:self._limit]
+            return [project(d, self._projection, self._collection.document_class) for d in docs]
+
+    def __iter__(self):
+        return iter(self._evaluate())
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryCommandCursor:
+    """aggregate() results, already computed"""
+
+    def __init__(self, docs: list):
+        self._docs = docs
+
+    def _evaluate(self) -> list:
+        return self._docs
+
+    def __iter__(self):
+        return iter(self._docs)
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryCollection:
+    def __init__(self, database: "MemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self.document_class = database.document_class
+        self._lock = database._lock
+        self._docs = {}  # _id -> document, in insertion order
+        self._unique = {}  # index name -> (key paths, {frozen key: _id})
+
+    # -- indexes --------------------------------------------------------------
+
+    def _index_key(self, doc: dict, paths: tuple):
+        return tuple(_freeze(None if (v := _get_path(doc, p)) is _MISSING else v) for p in paths)
+
+    def create_index(self, keys, unique: bool = False, name: Optional[str] = None, **kwargs) -> str:
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = list(keys.items()) if isinstance(keys, dict) else list(keys)
+        name = name or "_".join(f"{k}_{d}" for k, d in keys)
+        if unique and name not in self._unique:
+            paths = tuple(k for k, _ in keys)
+            entries = {}
+            with self._lock:
+                for _id, doc in self._docs.items():
+                    key = self._index_key(doc, paths)
+                    if key in entries:
+                        raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}", 11000)
+                    entries[key] = _id
+                self._unique[name] = (paths, entries)
+        return name
+
+    def create_indexes(self, indexes) -> list:
+        names = []
+        for index in indexes:
+            spec = index.document
+            options = {k: v for k, v in spec.items() if k not in ("key", "name", "unique")}
+            names.append(self.create_index(list(spec["key"].items()), unique=spec.get("unique", False), name=spec.get("name"), **options))
+        return names
+
+    def _check_unique(self, doc: dict, replacing=None) -> None:
+        for name, (paths, entries) in self._unique.items():
+            owner = entries.get(self._index_key(doc, paths), _MISSING)
+            if owner is not _MISSING and owner != replacing:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}", 11000)
+
+    def _index_add(self, doc: dict) -> None:
+        for paths, entries in self._unique.values():
+            entries[self._index_key(doc, paths)] = doc["_id"]
+
+    def _index_remove(self, doc: dict) -> None:
+        for paths, entries in self._unique.values():
+            entries.pop(self._index_key(doc, paths), None)
+
+    # -- writes ---------------------------------------------------------------
+
+    def _insert(self, document: dict):
+        doc = _copy(document)
+        if "_id" not in doc:
+            doc = {"_id": ObjectId(), **doc}
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_", 11000)
+        self._check_unique(doc)
+        self._docs[doc["_id"]] = doc
+        self._index_add(doc)
+        # pymongo sets the generated _id on the caller's document too
+        document.setdefault("_id", doc["_id"])
+        return doc["_id"]
+
+    def _update(self, query: dict, update: dict, upsert: bool, multi: bool) -> dict:
+        """Returns a raw result with n, nModified and (on upsert) upserted"""
+        targets = [d for d in self._docs.values() if matches(d, query)]
+        if not multi:
+            targets = targets[:1]
+        if not targets:
+            if not upsert:
+                return {"n": 0, "nModified": 0}
+            doc = _upsert_seed(query)
+            _apply_update(doc, update, inserting=True)
+            _id = self._insert(doc)
+            return {"n": 1, "nModified": 0, "upserted": _id}
+        modified = 0
+        for current in targets:
+            updated = _copy(current)
+            _apply_update(updated, update, inserting=False)
+            if updated == current:
+                continue
+            self._check_unique(updated, replacing=current["_id"])
+            self._index_remove(current)
+            self._docs[current["_id"]] = updated
+            self._index_add(updated)
+            modified += 1
+        return {"n": len(targets), "nModified": modified}
+
+    def _delete(self, query: dict, multi: bool) -> int:
+        targets = [d for d in self._docs.values() if matches(d, query)]
+        if not multi:
+            targets = targets[:1]
+        for doc in targets:
+            self._index_remove(doc)
+            del self._docs[doc["_id"]]
+        return len(targets)
+
+    def insert_one(self, document: dict, **kwargs) -> InsertOneResult:
+        with self._lock:
+            return InsertOneResult(self._insert(document), True)
+
+    def insert_many(self, documents: Iterable[dict], ordered: bool = True, **kwargs) -> InsertManyResult:
+        _, inserted_ids = self._bulk([InsertOne(d) for d in documents], ordered)
+        return InsertManyResult(inserted_ids, True)
+
+    def update_one(self, filter: dict, update: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        with self._lock:
+            return UpdateResult(self._update(filter, update, upsert, multi=False), True)
+
+    def update_many(self, filter: dict, update: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        with self._lock:
+            return UpdateResult(self._update(filter, update, upsert, multi=True), True)
+
+    def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        return self.update_one(filter, replacement, upsert=upsert)
+
+    def delete_one(self, filter: dict, **kwargs) -> DeleteResult:
+        with self._lock:
+            return DeleteResult({"n": self._delete(filter, multi=False)}, True)
+
+    def delete_many(self, filter: dict, **kwargs) -> DeleteResult:
+        with self._lock:
+            return DeleteResult({"n": self._delete(filter, multi=True)}, True)
+
+    def bulk_write(self, requests: list, ordered: bool = True, **kwargs) -> BulkWriteResult:
+        summary, _ = self._bulk(requests, ordered)
+        return BulkWriteResult(summary, True)
+
+    def _bulk(self, requests: list, ordered: bool):
+        """Apply write operations; returns (bulk API summary, inserted ids)"""
+        summary = {
+            "writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+            "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+        }
+        inserted_ids = []
+        with self._lock:
+            for index, op in enumerate(requests):
+                try:
+                    # pymongo's operation classes keep their arguments in private slots
+                    if isinstance(op, InsertOne):
+                        inserted_ids.append(self._insert(op._doc))
+                        summary["nInserted"] += 1
+                        continue
+                    if isinstance(op, (DeleteOne, DeleteMany)):
+                        summary["nRemoved"] += self._delete(op._filter, multi=isinstance(op, DeleteMany))
+                        continue
+                    if isinstance(op, (UpdateOne, UpdateMany, ReplaceOne)):
+                        raw = self._update(op._filter, op._doc, bool(op._upsert), multi=isinstance(op, UpdateMany))
+                    else:
+                        raise OperationFailure(f"unsupported bulk operation: {type(op).__name__}")
+                except DuplicateKeyError as e:
+                    summary["writeErrors"].append({"index": index, "code": 11000, "errmsg": str(e), "op": getattr(op, "_doc", None)})
+                    if ordered:
+                        break
+                    continue
+                if "upserted" in raw:
+                    summary["nUpserted"] += 1
+                    summary["upserted"].append({"index": index, "_id": raw["upserted"]})
+                else:
+                    summary["nMatched"] += raw["n"]
+                    summary["nModified"] += raw["nModified"]
+        if summary["writeErrors"]:
+            raise BulkWriteError(summary)
+        return summary, inserted_ids
+
+    # -- reads ----------------------------------------------------------------
+
+    def find(self, filter: Optional[dict] = None, projection: Optional[dict] = None, sort=None, limit: int = 0, skip: int = 0, **kwargs) -> MemoryCursor:
+        cursor = MemoryCursor(self, filter, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    def find_one(self, filter: Optional[dict] = None, projection: Optional[dict] = None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        for doc in self.find(filter, projection, **kwargs).limit(1):
+            return doc
+        return None
+
+    def aggregate(self, pipeline: list, **kwargs) -> MemoryCommandCursor:
+        with self._lock:
+            docs = list(self._docs.values())
+            return MemoryCommandCursor(aggregate(docs, pipeline))
+
+    def count_documents(self, filter: Optional[dict] = None, **kwargs) -> int:
+        with self._lock:
+            return sum(1 for d in self._docs.values() if matches(d, filter))
+
+    def estimated_document_count(self, **kwargs) -> int:
+        return len(self._docs)
+
+    def drop(self) -> None:
+        self.database.drop_collection(self.name)
+
+
+class MemoryDatabase:
+    def __init__(self, client: "MemoryClient", name: str):
+        self.client = client
+        self.name = name
+        self.document_class = client.document_class
+        self._lock = client._lock
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = self._collections[name] = MemoryCollection(self, name)
+            return collection
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        return self[name]
+
+    def list_collection_names(self, **kwargs) -> list:
+        return [name for name, c in self._collections.items() if c._docs]
+
+    def drop_collection(self, name: str) -> None:
+        with self._lock:
+            self._collections.pop(name, None)
+
+
+class MemoryClient:
+    """Stand-in for pymongo.MongoClient; one store per instance"""
+
+    def __init__(self, document_class=dict, **kwargs):
+        self.document_class = document_class
+        self._lock = threading.RLock()
+        self._databases = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        with self._lock:
+            database = self._databases.get(name)
+            if database is None:
+                database = self._databases[name] = MemoryDatabase(self, name)
+            return database
+
+    def get_database(self, name: str, **kwargs) -> MemoryDatabase:
+        return self[name]
+
+    def drop_database(self, name: str) -> None:
+        with self._lock:
+            self._databases.pop(name, None)
+
+    def close(self) -> None:
+        pass
+
+
+# -----------------------------------------------------------------------------
+# Async API (Motor-shaped). Operations are in-memory and fast, so they run
+# inline on the event loop rather than in a thread pool.
+# -----------------------------------------------------------------------------
+
+class AsyncMemoryCursor:
+    def __init__(self, cursor: MemoryCursor):
+        self._cursor = cursor
+        self._results = None
+
+    def sort(self, key_or_list, direction: int = 1) -> "AsyncMemoryCursor":
+        self._cursor.sort(key_or_list, direction)
+        return self
+
+    def skip(self, count: int) -> "AsyncMemoryCursor":
+        self._cursor.skip(count)
+        return self
+
+    def limit(self, count: int) -> "AsyncMemoryCursor":
+        self._cursor.limit(count)
+        return self
+
+    def batch_size(self, size: int) -> "AsyncMemoryCursor":
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> list:
+        docs = self._cursor._evaluate()
+        return docs[:length] if length else docs
+
+    def __aiter__(self):
+        self._results = iter(self._cursor._evaluate())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._results)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self) -> None:
+        pass
+
+
+class AsyncMemoryCollection:
+    def __init__(self, collection: MemoryCollection):
+        self.delegate = collection
+        self.name = collection.name
+
+    def find(self, *args, **kwargs) -> AsyncMemoryCursor:
+        return AsyncMemoryCursor(self.delegate.find(*args, **kwargs))
+
+    def aggregate(self, *args, **kwargs) -> AsyncMemoryCursor:
+        # Like Motor, returns a cursor rather than a coroutine
+        return AsyncMemoryCursor(self.delegate.aggregate(*args, **kwargs))
+
+    def __getattr__(self, name: str):
+        method = getattr(self.delegate, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncMemoryDatabase:
+    def __init__(self, database: MemoryDatabase):
+        self.delegate = database
+        self.name = database.name
+
+    def __getitem__(self, name: str) -> AsyncMemoryCollection:
+        return AsyncMemoryCollection(self.delegate[name])
+
+    def __getattr__(self, name: str) -> AsyncMemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str, **kwargs) -> AsyncMemoryCollection:
+        return self[name]
+
+    async def list_collection_names(self, **kwargs) -> list:
+        return self.delegate.list_collection_names()
+
+    async def drop_collection(self, name: str) -> None:
+        self.delegate.drop_collection(name)
+
+
+class AsyncMemoryClient:
+    """Stand-in for AsyncIOMotorClient sharing the store of a MemoryClient"""
+
+    def __init__(self, client: MemoryClient):
+        self.delegate = client
+
+    def __getitem__(self, name: str) -> AsyncMemoryDatabase:
+        return AsyncMemoryDatabase(self.delegate[name])
+
+    def get_database(self, name: str, **kwargs) -> AsyncMemoryDatabase:
+        return self[name]
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,178 @@
+"""
+Request metrics in Prometheus text format
+
+A small, dependency-free metrics registry plus an ASGI middleware that records
+per-route request counts, latency and response size histograms, and an
+in-flight gauge. Routes are labelled by their path template (`/feed/{email}`,
+not `/feed/a@b.c`) so label cardinality stays bounded. `render()` produces the
+Prometheus exposition format served on GET /metrics.
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+_registry: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), register: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        if register:
+            _registry.append(self)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self) -> dict:
+        """Snapshot of {labelvalues: value}"""
+        return dict(self._values)
+
+    def collect(self) -> list:
+        lines = self.header()
+        for labelvalues, value in self.samples().items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labelvalues, amount: float = 1) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, *labelvalues, value: float) -> None:
+        self._values[labelvalues] = value
+
+
+class CallbackMetric(_Metric):
+    """Counter or gauge whose samples are read from `fn() -> {labelvalues: value}` at scrape time"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str], fn: Callable[[], Dict[Tuple, float]], kind: str = "gauge", **kwargs):
+        super().__init__(name, documentation, labelnames, **kwargs)
+        self.fn = fn
+        self.kind = kind
+
+    def collect(self) -> list:
+        lines = self.header()
+        for labelvalues, value in self.fn().items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple = LATENCY_BUCKETS, **kwargs):
+        super().__init__(name, documentation, labelnames, **kwargs)
+        self.buckets = tuple(buckets)
+        # labelvalues -> [per-bucket counts (+Inf last), sum]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, *labelvalues, value: float) -> None:
+        state = self._values.get(labelvalues)
+        if state is None:
+            state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def collect(self) -> list:
+        lines = self.header()
+        for labelvalues, (counts, total) in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render() -> bytes:
+    """Every registered metric in Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return ("\n".join(lines) + "\n").encode()
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_LABELS = ("method", "route", "status")
+http_requests = Counter("http_requests_total", "HTTP requests handled", HTTP_LABELS)
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency", HTTP_LABELS)
+http_response_size = Histogram("http_response_size_bytes", "HTTP response body size", HTTP_LABELS, buckets=SIZE_BUCKETS)
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being handled")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no per-request Request/Response objects) feeding the http_* metrics"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec()
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "unmatched"), str(status))
+            http_requests.inc(*labels)
+            http_latency.observe(*labels, value=elapsed)
+            http_response_size.observe(*labels, value=size)
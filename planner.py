@@ -0,0 +1,219 @@
+"""
+Macro-targeted meal plan optimizer
+
+Chooses servings per meal that reach a daily protein target at the lowest
+total price (or calories) using at most `max_meals` different meals. Each
+chosen meal is served at one of the levels MIN_SERVINGS..max_servings in
+SERVING_STEP steps, and protein is counted in whole grams rounded down, so
+a plan found always meets the target. Within those rules the plan returned
+is optimal:
+
+1. Shortlist. If `max_meals` other meals each have at least as much protein
+   per serving at no higher cost per serving, one of them is left out of any
+   plan and can take the meal's place at the same servings. Only the first
+   `max_meals` Pareto layers of (protein, cost) per serving are kept.
+2. Pruning. Let `rate` be the lowest cost per gram of any (meal, servings)
+   option. A plan costs at least its options' excess over `rate` plus
+   rate * target, so once some plan costing U is known, options whose
+   excess exceeds U - rate * target cannot be part of a cheaper one, and
+   U also caps how many meals a cheaper plan can hold. U comes from
+   solving step 3 over the meals with the least excess first. An option
+   is also dropped when more than that many other meals cover as many
+   grams for less, as one of them would be free to replace it.
+3. DP over what is left. State is (meals used, grams covered, capped at the
+   target); each meal is skipped or taken at one of its remaining options.
+
+A 10k-meal catalog solves in a few milliseconds up to max_meals=20.
+"""
+import math
+
+import numpy as np
+
+from catalog import CatalogSnapshot
+
+# SubscriptionItem.servings bounds
+MIN_SERVINGS = 0.5
+MAX_SERVINGS = 5.0
+# Servings are chosen in steps of this size
+SERVING_STEP = 0.25
+# Meals, and meals per plan, in the first DP that bounds the plan cost
+SEED_MEALS = 8
+SEED_PLAN_MEALS = 3
+
+
+def serving_levels(max_servings: float) -> np.ndarray:
+    """Allowed servings per chosen meal: MIN_SERVINGS..max_servings in SERVING_STEP steps"""
+    levels = np.arange(MIN_SERVINGS, max_servings + 1e-9, SERVING_STEP)
+    if levels.size == 0 or levels[-1] < max_servings - 1e-9:
+        levels = np.append(levels, max_servings)
+    return levels
+
+
+def shortlist(protein: np.ndarray, cost: np.ndarray, layers: int) -> np.ndarray:
+    """Indices in the first `layers` Pareto layers (more protein, lower cost per serving is better)"""
+    remaining = np.lexsort((-protein, cost))
+    chosen = []
+    for _ in range(layers):
+        if remaining.size == 0:
+            break
+        # In cost order, a meal is on the frontier when it has more protein
+        # than every cheaper meal still in play
+        p = protein[remaining]
+        best_before = np.concatenate(([-np.inf], np.maximum.accumulate(p)[:-1]))
+        front = p > best_before
+        chosen.append(remaining[front])
+        remaining = remaining[~front]
+    return np.concatenate(chosen) if chosen else remaining[:0]
+
+
+def optimize(
+    catalog: CatalogSnapshot,
+    target_protein: float,
+    mask: np.ndarray,
+    objective: str = "price",
+    max_meals: int = 6,
+    max_servings: float = MAX_SERVINGS,
+) -> dict:
+    """Servings per meal reaching target_protein at minimum total `objective`.
+
+    Returns {"feasible", "rows", "servings"}; when the target is out of reach
+    with max_meals meals, the `max_meals` meals with the most protein per
+    serving are returned at max_servings with feasible=False.
+    """
+    protein = catalog.protein
+    cost = catalog.price if objective == "price" else catalog.calories
+    rows = np.flatnonzero(mask & (protein > 0))
+    if rows.size == 0:
+        return {"feasible": False, "rows": np.array([], dtype=int), "servings": np.array([])}
+
+    k = min(max_meals, rows.size)
+    candidates = rows[shortlist(protein[rows], cost[rows], k)]
+    levels = serving_levels(max_servings)
+    target = max(math.ceil(target_protein - 1e-9), 1)
+    grams = np.minimum(np.floor(np.outer(protein[candidates], levels) + 1e-9).astype(np.int64), target)
+    plan = _solve(grams, np.outer(cost[candidates], levels), target, k)
+    if plan is None:
+        top = rows[np.argsort(-protein[rows], kind="stable")[:k]]
+        return {"feasible": False, "rows": top, "servings": np.full(top.size, max_servings)}
+
+    picks, level_index = plan
+    rows = candidates[picks]
+    servings = levels[level_index]
+    order = np.argsort(cost[rows] / protein[rows], kind="stable")
+    return {"feasible": True, "rows": rows[order], "servings": servings[order]}
+
+
+def _solve(grams: np.ndarray, costs: np.ndarray, target: int, max_meals: int):
+    """(meal indices, level indices) of the cheapest plan, or None if infeasible.
+
+    grams and costs are (meals, levels); grams are capped at the target.
+    """
+    if np.sort(grams[:, -1])[::-1][:max_meals].sum() < target:
+        return None
+    usable = grams > 0
+    rate = np.min(costs[usable] / grams[usable])
+    excess = np.where(usable, costs - rate * grams, np.inf)
+
+    # A first plan bounds the cost: the DP over every option of the meals
+    # with the least excess, plus just enough of the highest-protein meals
+    # at their largest option to reach the target, so that it always finds one
+    top = np.argsort(-grams[:, -1], kind="stable")[:max_meals]
+    top = top[:np.searchsorted(np.cumsum(grams[top, -1]), target) + 1]
+    seed = np.zeros(excess.shape, dtype=bool)
+    seed[np.argsort(excess.min(axis=1), kind="stable")[:SEED_MEALS]] = True
+    seed[top, -1] = True
+    seed &= usable
+    plan = _knapsack(grams, costs, seed, target, min(max_meals, max(top.size, SEED_PLAN_MEALS)))
+    bound = costs[plan].sum()
+
+    keep = excess <= bound - rate * target + 1e-9 * max(1.0, abs(bound))
+    max_meals = _meals_within(costs, excess, keep, rate * target, bound, max_meals)
+    keep &= ~_outclassed(grams, costs, keep, target, max_meals)
+    plan = _knapsack(grams, costs, keep, target, max_meals)
+    return tuple(np.nonzero(plan))
+
+
+def _meals_within(costs, excess, allowed, floor_cost, bound, max_meals) -> int:
+    """Most meals a plan costing at most `bound` can use.
+
+    Each meal adds at least its cheapest allowed option to the cost, and at
+    least its smallest excess on top of floor_cost (rate * target).
+    """
+    cheapest = np.sort(np.where(allowed, costs, np.inf).min(axis=1))[:max_meals]
+    smallest = np.sort(np.where(allowed, excess, np.inf).min(axis=1))[:max_meals]
+    budget = bound * (1 + 1e-9) + 1e-9
+    fits = (np.cumsum(cheapest) <= budget) & (floor_cost + np.cumsum(smallest) <= budget)
+    return max(1, int(np.logical_and.accumulate(fits).sum()))
+
+
+def _outclassed(grams, costs, allowed, target, max_meals) -> np.ndarray:
+    """Options for which max_meals other meals cover as many grams for less.
+
+    A plan using such an option leaves one of those meals out and would be
+    cheaper with it instead.
+    """
+    meals = np.flatnonzero(allowed.any(axis=1))
+    if meals.size <= max_meals:
+        return np.zeros(allowed.shape, dtype=bool)
+    g = np.where(allowed[meals], grams[meals], -1)
+    c = costs[meals]
+    # reach[m, t]: cheapest allowed option of meal m covering at least t grams
+    t = np.arange(target + 1)
+    reach = np.full((meals.size, target + 1), np.inf)
+    for level in range(g.shape[1] - 1, -1, -1):
+        reach = np.where(t <= g[:, level, None], c[:, level, None], reach)
+    # max_meals + 1 cheapest, as the option's own meal may be among them
+    threshold = np.partition(reach, max_meals, axis=0)[max_meals]
+    outclassed = np.zeros(allowed.shape, dtype=bool)
+    outclassed[meals] = c > threshold[np.maximum(g, 0)]
+    return outclassed
+
+
+def _knapsack(grams: np.ndarray, costs: np.ndarray, allowed: np.ndarray, target: int, max_meals: int):
+    """Boolean (meals, levels) mask of the cheapest plan using allowed options only, or None"""
+    meals = np.flatnonzero(allowed.any(axis=1))
+    n = meals.size
+    best = np.full((max_meals + 1, target + 1), np.inf)
+    best[0, 0] = 0.0
+    # Per meal: option taken (-1 = skipped), and for the capped target
+    # column the grams covered before it (elsewhere that is t - grams)
+    taken = np.full((n, max_meals + 1, target + 1), -1, dtype=np.int16)
+    capped_from = np.zeros((n, max_meals + 1), dtype=np.int32)
+
+    counts = np.arange(max_meals)
+    for i, meal in enumerate(meals):
+        levels = np.flatnonzero(allowed[meal])
+        # options[o, c, t]: cost of reaching (c + 1 meals, t grams) by taking
+        # this meal's o-th allowed option
+        options = np.full((levels.size, max_meals, target + 1), np.inf)
+        origin = np.empty((levels.size, max_meals), dtype=np.int64)
+        for o, level in enumerate(levels):
+            g = grams[meal, level]
+            add = costs[meal, level]
+            # Below the cap, covered grams shift by g; everything from
+            # target - g up lands on the (capped) target column
+            options[o, :, g:target] = best[:-1, :target - g] + add
+            tail = best[:-1, target - g:]
+            first = np.argmin(tail, axis=1)
+            options[o, :, target] = tail[counts, first] + add
+            origin[o] = target - g + first
+        choice = np.argmin(options, axis=0)
+        value = np.take_along_axis(options, choice[None], axis=0)[0]
+        better = value < best[1:]
+        best[1:][better] = value[better]
+        taken[i, 1:][better] = levels[choice[better]]
+        capped_from[i, 1:] = origin[choice[:, target], counts]
+
+    count = int(np.argmin(best[:, target]))
+    if not np.isfinite(best[count, target]):
+        return None
+    plan = np.zeros(allowed.shape, dtype=bool)
+    covered = target
+    for i in range(n - 1, -1, -1):
+        level = taken[i, count, covered]
+        if level < 0:
+            continue
+        plan[meals[i], level] = True
+        covered = int(capped_from[i, count]) if covered == target else covered - int(grams[meals[i], level])
+        count -= 1
+    return plan
@@ -68,12 +68,7 @@ def add_comment_to_post(post_id: str, author_id: str, comment_text: str):
     }
     
     # Add comment to post's comments array
-    from database import db
-    result = db.posts.update_one(
-        {"_id": ObjectId(post_id)},
-        {"$push": {"comments": comment}}
-    )
-    return result.modified_count > 0
+    return update_document("posts", post_id, {"$push": {"comments": comment}}) > 0
 
 # =============================================================================
 # E-COMMERCE SCHEMA
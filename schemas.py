@@ -5,8 +5,8 @@ Each Pydantic model represents a MongoDB collection.
 Collection name = lowercase of class name.
 """
 from __future__ import annotations
-from pydantic import BaseModel, Field, EmailStr, conlist, conint, confloat
-from typing import Optional, List, Dict, Literal
+from pydantic import BaseModel, Field, EmailStr, computed_field, conlist, conint, confloat
+from typing import Iterable, Optional, List, Dict, Literal, get_args
 
 # Core nutrition structure used across models
 class Macros(BaseModel):
@@ -16,6 +16,16 @@ class Macros(BaseModel):
     calories: confloat(ge=0) = Field(..., description="Calories per serving")
 
 DietTag = Literal["vegan", "vegetarian", "keto", "low-carb", "gluten-free", "dairy-free"]
+DIET_TAGS = get_args(DietTag)
+_DIET_BITS = {tag: 1 << i for i, tag in enumerate(DIET_TAGS)}
+
+def diet_mask(tags: Iterable[str]) -> int:
+    """Bitmask of the known diet tags in `tags` (bit i = DIET_TAGS[i])"""
+    mask = 0
+    for tag in tags or ():
+        mask |= _DIET_BITS.get(tag, 0)
+    return mask
+
 CategoryType = Literal["Breakfasts", "Main Meals", "Smoothies & Shakes"]
 
 class Meal(BaseModel):
@@ -30,6 +40,12 @@ class Meal(BaseModel):
     is_customizable: bool = Field(False, description="Whether meal supports add-ons/size customization")
     available_add_ons: Optional[List[str]] = Field(default=None, description="Available add-ons for customizable items")
 
+    # Stored with the document so diet queries are one bitwise test
+    @computed_field
+    @property
+    def diet_mask(self) -> int:
+        return diet_mask(self.diet_tags)
+
 class SmoothiePreset(BaseModel):
     name: str
     base: str
@@ -41,6 +57,8 @@ class SubscriptionItem(BaseModel):
     meal_id: str = Field(..., description="MongoDB ObjectId as string")
     servings: confloat(ge=0.5, le=5) = Field(1.0, description="Portion multiplier per delivery")
 
+# Stored subscriptions also carry each item's title, price and macros plus
+# totals, copied from the meal at signup (see subscription_document in main.py)
 class Subscription(BaseModel):
     email: EmailStr
     frequency: Literal["weekly", "biweekly", "monthly"]
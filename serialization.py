@@ -0,0 +1,51 @@
+"""
+JSON serialization for API responses
+
+MongoJSONResponse renders with orjson and understands the types that come
+back from MongoDB: ObjectId becomes a string and datetimes are encoded
+natively. Documents read through database.py are MongoDocument instances,
+which the encoder emits with `_id` renamed to `id`, so endpoints can return
+raw query results without rewriting each document first.
+
+FastAPI runs `jsonable_encoder` over plain return values before the response
+class sees them, which both costs time and rejects ObjectId. Hot endpoints
+should return a MongoJSONResponse instance directly to skip that step.
+"""
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+
+class MongoDocument(dict):
+    """Document class for the Mongo clients; serialized with `_id` exposed as `id`"""
+
+
+def encode_default(obj: Any) -> Any:
+    """orjson fallback for Mongo types and passed-through subclasses"""
+    if isinstance(obj, MongoDocument):
+        return {("id" if k == "_id" else k): v for k, v in obj.items()}
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    # OPT_PASSTHROUGH_SUBCLASS routes every builtin subclass here
+    if isinstance(obj, str):
+        return str(obj)
+    if isinstance(obj, int):
+        return int(obj)
+    if isinstance(obj, dict):
+        return dict(obj)
+    if isinstance(obj, list):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=encode_default, option=orjson.OPT_PASSTHROUGH_SUBCLASS)
+
+
+class MongoJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
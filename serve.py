@@ -0,0 +1,57 @@
+"""
+Production entry point
+
+Runs main:app under gunicorn with one uvicorn worker per core. Uvicorn's
+worker picks uvloop and httptools automatically when they are installed.
+All knobs come from ServerSettings (WEB_CONCURRENCY, BACKLOG, KEEPALIVE,
+MAX_REQUESTS, ...).
+
+    python serve.py
+
+Send SIGHUP for a graceful restart (new workers start before old ones are
+retired) and SIGTERM for a graceful shutdown.
+"""
+import os
+
+from gunicorn.app.base import BaseApplication
+from gunicorn.util import import_app
+
+from settings import ServerSettings
+
+APP_URI = "main:app"
+
+
+class Server(BaseApplication):
+    def __init__(self, settings: ServerSettings):
+        self.settings = settings
+        super().__init__()
+
+    def load_config(self):
+        s = self.settings
+        options = {
+            "bind": f"{s.host}:{s.port}",
+            "workers": s.workers,
+            "worker_class": "uvicorn.workers.UvicornWorker",
+            "backlog": s.backlog,
+            "keepalive": s.keepalive,
+            "timeout": s.timeout,
+            "graceful_timeout": s.graceful_timeout,
+            "max_requests": s.max_requests,
+            "max_requests_jitter": s.max_requests_jitter,
+            "preload_app": s.preload_app,
+            "loglevel": s.log_level,
+            "accesslog": "-",
+            "errorlog": "-",
+        }
+        # Worker heartbeats on tmpfs avoid stalls on slow container disks
+        if os.path.isdir("/dev/shm"):
+            options["worker_tmp_dir"] = "/dev/shm"
+        for key, value in options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return import_app(APP_URI)
+
+
+if __name__ == "__main__":
+    Server(ServerSettings.from_env()).run()
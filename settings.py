@@ -0,0 +1,146 @@
+"""
+Typed runtime settings loaded from environment variables
+
+Each settings class is a frozen dataclass with a `from_env()` constructor so
+configuration is parsed and validated once, at startup, instead of scattered
+`os.getenv` calls.
+"""
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+
+def _env_str(name: str, default: Optional[str] = None) -> Optional[str]:
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def _env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    value = _env_str(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+
+
+def _env_float(name: str, default: Optional[float] = None) -> Optional[float]:
+    value = _env_str(name)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {value!r}")
+
+
+@dataclass(frozen=True)
+class MongoSettings:
+    """Connection, pool and timeout settings for the MongoDB clients"""
+    # "mongo" for a real server, "memory" for the in-process stand-in (memory_backend.py)
+    backend: str = "mongo"
+    url: Optional[str] = None
+    name: Optional[str] = None
+    min_pool_size: int = 0
+    max_pool_size: int = 100
+    max_idle_time_ms: Optional[int] = 300_000
+    # Fail fast instead of queueing forever when the pool is exhausted
+    wait_queue_timeout_ms: Optional[int] = 2_000
+    connect_timeout_ms: int = 5_000
+    socket_timeout_ms: Optional[int] = 10_000
+    server_selection_timeout_ms: int = 5_000
+    compressors: Optional[str] = None
+    read_preference: str = "primary"
+    write_concern: Optional[str] = None
+    slow_command_ms: float = 100.0
+
+    @classmethod
+    def from_env(cls) -> "MongoSettings":
+        defaults = cls()
+        backend = _env_str("DATABASE_BACKEND", defaults.backend).lower()
+        if backend not in ("mongo", "memory"):
+            raise ValueError(f"DATABASE_BACKEND must be 'mongo' or 'memory', got {backend!r}")
+        return cls(
+            backend=backend,
+            url=_env_str("DATABASE_URL"),
+            name=_env_str("DATABASE_NAME"),
+            min_pool_size=_env_int("MONGO_MIN_POOL_SIZE", defaults.min_pool_size),
+            max_pool_size=_env_int("MONGO_MAX_POOL_SIZE", defaults.max_pool_size),
+            max_idle_time_ms=_env_int("MONGO_MAX_IDLE_TIME_MS", defaults.max_idle_time_ms),
+            wait_queue_timeout_ms=_env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", defaults.wait_queue_timeout_ms),
+            connect_timeout_ms=_env_int("MONGO_CONNECT_TIMEOUT_MS", defaults.connect_timeout_ms),
+            socket_timeout_ms=_env_int("MONGO_SOCKET_TIMEOUT_MS", defaults.socket_timeout_ms),
+            server_selection_timeout_ms=_env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", defaults.server_selection_timeout_ms),
+            compressors=_env_str("MONGO_COMPRESSORS", defaults.compressors),
+            read_preference=_env_str("MONGO_READ_PREFERENCE", defaults.read_preference),
+            write_concern=_env_str("MONGO_WRITE_CONCERN", defaults.write_concern),
+            slow_command_ms=_env_float("MONGO_SLOW_COMMAND_MS", defaults.slow_command_ms),
+        )
+
+    @property
+    def configured(self) -> bool:
+        return self.backend == "memory" or bool(self.url and self.name)
+
+    @property
+    def database_name(self) -> Optional[str]:
+        if self.backend == "memory":
+            return self.name or "memory"
+        return self.name
+
+    def client_kwargs(self) -> dict:
+        """Keyword arguments for MongoClient / AsyncIOMotorClient"""
+        kwargs = {
+            "minPoolSize": self.min_pool_size,
+            "maxPoolSize": self.max_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "compressors": self.compressors,
+            "readPreference": self.read_preference,
+        }
+        if self.write_concern:
+            # "majority" or a node count
+            kwargs["w"] = int(self.write_concern) if self.write_concern.isdigit() else self.write_concern
+        return {k: v for k, v in kwargs.items() if v is not None}
+
+
+@dataclass(frozen=True)
+class ServerSettings:
+    """Process model and socket settings for the production launcher (serve.py)"""
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = os.cpu_count() or 1
+    backlog: int = 2048
+    keepalive: int = 5
+    timeout: int = 60
+    graceful_timeout: int = 30
+    # Recycle workers after this many requests (0 disables), jittered to avoid restart storms
+    max_requests: int = 10_000
+    max_requests_jitter: int = 1_000
+    preload_app: bool = False
+    log_level: str = "info"
+
+    @classmethod
+    def from_env(cls) -> "ServerSettings":
+        defaults = cls()
+        return cls(
+            host=_env_str("HOST", defaults.host),
+            port=_env_int("PORT", defaults.port),
+            workers=max(1, _env_int("WEB_CONCURRENCY", defaults.workers)),
+            backlog=_env_int("BACKLOG", defaults.backlog),
+            keepalive=_env_int("KEEPALIVE", defaults.keepalive),
+            timeout=_env_int("WORKER_TIMEOUT", defaults.timeout),
+            graceful_timeout=_env_int("GRACEFUL_TIMEOUT", defaults.graceful_timeout),
+            max_requests=_env_int("MAX_REQUESTS", defaults.max_requests),
+            max_requests_jitter=_env_int("MAX_REQUESTS_JITTER", defaults.max_requests_jitter),
+            preload_app=_env_str("PRELOAD_APP", "false").lower() in ("1", "true", "yes"),
+            log_level=_env_str("LOG_LEVEL", defaults.log_level),
+        )
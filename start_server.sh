@@ -2,7 +2,7 @@
 echo "Starting FastAPI backend server..."
 
 # Find and kill MainThread processes
-PIDS=$(ps | grep uvicorn | grep -v grep | awk '{print $1}')
+PIDS=$(ps | grep -E 'uvicorn|serve.py' | grep -v grep | awk '{print $1}')
 if [ ! -z "$PIDS" ]; then
   echo "Killing uvicorn processes: $PIDS"
   for pid in $PIDS; do
@@ -15,5 +15,11 @@ mkdir -p logs
 echo "Installing dependencies..."
 pip install -r requirements.txt
 echo "Starting FastAPI server..."
-nohup uvicorn main:app --host 0.0.0.0 --port 8000 --reload > logs/server.log 2>&1 
+if [ "$1" = "--dev" ]; then
+  # Single process with the file-watcher reloader, for local development only
+  nohup uvicorn main:app --host 0.0.0.0 --port 8000 --reload > logs/server.log 2>&1 
+else
+  # One worker per core; tune with WEB_CONCURRENCY, BACKLOG, KEEPALIVE, MAX_REQUESTS (see settings.py)
+  nohup python serve.py > logs/server.log 2>&1 
+fi
 echo "Server started in background"
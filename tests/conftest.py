@@ -0,0 +1,19 @@
+import dataclasses
+import os
+import sys
+
+import pytest
+
+# Modules live at the repository root (main.py, database.py, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def memory_db(monkeypatch):
+    """Point database.py at a fresh in-process store (DATABASE_BACKEND=memory)"""
+    import database
+
+    database.close_clients()
+    monkeypatch.setattr(database, "mongo_settings", dataclasses.replace(database.mongo_settings, backend="memory"))
+    yield database.get_db()
+    database.close_clients()
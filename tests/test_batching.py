@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from pymongo.errors import WriteError
+
+from batching import GroupCommitter, WriteBehindBuffer
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_write_behind_coalesces_per_key():
+    flushed = []
+
+    async def flush(batch):
+        flushed.append(dict(batch))
+
+    async def scenario():
+        buffer = WriteBehindBuffer("test-coalesce", flush, max_batch=100, max_delay=0.01)
+        for value in range(10):
+            buffer.put("a", value)
+        buffer.put("b", 1)
+        assert buffer.get("a") == 9
+        await buffer.drain()
+
+    run(scenario())
+    assert flushed == [{"a": 9, "b": 1}]
+
+
+def test_write_behind_rejects_when_full():
+    async def flush(batch):
+        pass
+
+    async def scenario():
+        buffer = WriteBehindBuffer("test-full", flush, max_delay=0.01, max_pending=2)
+        buffer.put("a", 1)
+        buffer.put("b", 1)
+        buffer.put("a", 2)  # replacing a buffered key is always allowed
+        with pytest.raises(RuntimeError):
+            buffer.put("c", 1)
+        await buffer.drain()
+
+    run(scenario())
+
+
+def test_write_behind_drops_after_max_retries():
+    attempts = []
+
+    async def flush(batch):
+        attempts.append(dict(batch))
+        raise ConnectionError("database down")
+
+    async def scenario():
+        buffer = WriteBehindBuffer("test-retries", flush, max_delay=0.001, max_retries=3)
+        buffer.put("a", 1)
+        for _ in range(200):
+            if buffer.pending() == 0:
+                break
+            await asyncio.sleep(0.005)
+        assert buffer.pending() == 0
+        await buffer.drain()
+
+    run(scenario())
+    assert attempts == [{"a": 1}] * 3
+
+
+def test_older_preference_flush_does_not_overwrite_newer():
+    from datetime import datetime, timedelta, timezone
+
+    from pymongo import UpdateOne
+
+    from main import newer_preference_update
+    from memory_backend import MemoryClient
+
+    collection = MemoryClient()["test"]["preference"]
+    earlier = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    newer = {"email": "a@example.com", "target_protein_g_per_day": 200, "diet_filters": [], "requested_at": earlier + timedelta(seconds=1)}
+    older = {"email": "a@example.com", "target_protein_g_per_day": 100, "diet_filters": ["vegan"], "requested_at": earlier}
+
+    # Two workers flush the same email in the wrong order
+    for fields in (newer, older):
+        collection.bulk_write([UpdateOne({"email": "a@example.com"}, newer_preference_update(fields), upsert=True)])
+
+    assert collection.count_documents({}) == 1
+    stored = collection.find_one({"email": "a@example.com"})
+    assert stored["target_protein_g_per_day"] == 200
+    assert stored["requested_at"] == newer["requested_at"]
+
+
+def test_group_commit_shares_one_commit():
+    commits = []
+
+    async def commit(items):
+        commits.append(list(items))
+        return [item * 10 for item in items]
+
+    async def scenario():
+        committer = GroupCommitter("test-group", commit, max_batch=100, max_wait=0.01)
+        return await asyncio.gather(*(committer.submit(i) for i in range(5)))
+
+    assert run(scenario()) == [0, 10, 20, 30, 40]
+    assert commits == [[0, 1, 2, 3, 4]]
+
+
+def test_group_commit_error_reaches_only_its_caller():
+    async def commit(items):
+        return [WriteError("duplicate", 11000) if item == "dup" else item.upper() for item in items]
+
+    async def scenario():
+        committer = GroupCommitter("test-group-error", commit, max_batch=100, max_wait=0.01)
+        return await asyncio.gather(*(committer.submit(item) for item in ("a", "dup", "b")), return_exceptions=True)
+
+    first, failed, last = run(scenario())
+    assert (first, last) == ("A", "B")
+    assert isinstance(failed, WriteError) and failed.code == 11000
+
+
+def test_group_commit_drain_flushes_queued_items():
+    commits = []
+
+    async def commit(items):
+        commits.append(list(items))
+        return items
+
+    async def scenario():
+        committer = GroupCommitter("test-group-drain", commit, max_batch=100, max_wait=60)
+        callers = [asyncio.ensure_future(committer.submit(i)) for i in range(3)]
+        await asyncio.sleep(0)
+        assert committer.pending() == 3 and not commits
+        await committer.drain()
+        assert committer.pending() == 0
+        return await asyncio.gather(*callers)
+
+    assert run(scenario()) == [0, 1, 2]
+    assert commits == [[0, 1, 2]]
@@ -0,0 +1,149 @@
+"""
+GET /meals pages served from the catalog snapshot must match the pages the
+Mongo query path (query_meals) returns for the same request.
+"""
+import asyncio
+import math
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from schemas import diet_mask
+
+MEALS = [
+    # title, category, diet tags, protein, price
+    ("a", "Main Meals", ["vegan"], 30.0, 10.0),
+    ("b", "Breakfasts", [], 30.0, 8.0),
+    ("c", "Main Meals", ["vegan", "gluten-free"], 45.0, 12.0),
+    ("d", "Smoothies & Shakes", ["vegan"], 25.0, 0.0),  # free: protein per dollar is infinite
+    ("e", "Main Meals", ["keto"], 30.0, 6.0),
+    ("f", "Breakfasts", ["vegan"], 45.0, 9.0),
+    ("g", "Main Meals", [], 12.0, 0.0),
+    ("h", "Smoothies & Shakes", ["gluten-free"], 30.0, 7.5),
+    ("i", "Main Meals", ["vegan"], 50.0, 12.5),
+    ("j", "Breakfasts", ["keto"], 30.0, 15.0),
+]
+
+QUERIES = [
+    {},
+    {"category": "Main Meals"},
+    {"diet": "vegan"},
+    {"diets": "vegan,gluten-free"},
+    {"diets": "vegan,keto", "match": "any"},
+    {"min_protein": 30},
+]
+
+
+@pytest.fixture
+def client(memory_db, monkeypatch):
+    memory_db["meal"].insert_many([
+        {
+            "title": title,
+            "category": category,
+            "diet_tags": tags,
+            "diet_mask": diet_mask(tags),
+            "price": price,
+            "macros": {"protein": protein, "carbs": 10.0, "fats": 5.0, "calories": 300.0},
+        }
+        for title, category, tags, protein, price in MEALS
+    ])
+    main.invalidate_meal_caches()
+    yield TestClient(main.app)
+    main.invalidate_meal_caches()
+
+
+def all_pages(client, params, limit):
+    """Titles per page, following next_cursor to the end"""
+    pages = []
+    after = None
+    while True:
+        query = {**params, "limit": limit, "fields": "title"}
+        if after:
+            query["after"] = after
+        response = client.get("/meals", params=query)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append([m["title"] for m in body["items"]])
+        after = body["next_cursor"]
+        if not after:
+            return pages
+        assert len(pages) <= len(MEALS), "pagination does not terminate"
+
+
+def pages_from(client, monkeypatch, params, limit, snapshot: bool):
+    # A zero size limit makes get_catalog() decline, so GET /meals queries Mongo
+    monkeypatch.setattr(main, "CATALOG_SNAPSHOT_MAX_MEALS", 10_000 if snapshot else 0)
+    main.invalidate_meal_caches()
+    return all_pages(client, params, limit)
+
+
+@pytest.mark.parametrize("sort", ["id", "protein"])
+@pytest.mark.parametrize("params", QUERIES)
+@pytest.mark.parametrize("limit", [1, 3, 4, 100])
+def test_snapshot_pages_match_mongo_pages(client, monkeypatch, sort, params, limit):
+    params = {**params, "sort": sort}
+    snapshot_pages = pages_from(client, monkeypatch, params, limit, snapshot=True)
+    mongo_pages = pages_from(client, monkeypatch, params, limit, snapshot=False)
+    assert snapshot_pages == mongo_pages
+
+
+def test_protein_ties_are_ordered_by_id(client, monkeypatch):
+    pages = pages_from(client, monkeypatch, {"sort": "protein"}, 2, snapshot=True)
+    titles = [t for page in pages for t in page]
+    # Titles were inserted in id order, so equal protein keeps title order
+    by_protein = sorted(MEALS, key=lambda m: m[3])
+    assert titles == [m[0] for m in by_protein]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 100])
+def test_protein_per_dollar_pages_with_free_meals(client, monkeypatch, limit):
+    pages = pages_from(client, monkeypatch, {"sort": "protein_per_dollar"}, limit, snapshot=True)
+    titles = [t for page in pages for t in page]
+
+    def per_dollar(meal):
+        return math.inf if meal[4] == 0 else meal[3] / meal[4]
+
+    # Descending protein per dollar, free meals first, ties in id order
+    expected = [m[0] for m in sorted(MEALS, key=lambda m: -per_dollar(m))]
+    assert titles == expected
+    assert all(len(page) <= limit for page in pages)
+
+
+def test_protein_per_dollar_needs_snapshot(client, monkeypatch):
+    monkeypatch.setattr(main, "CATALOG_SNAPSHOT_MAX_MEALS", 0)
+    main.invalidate_meal_caches()
+    assert client.get("/meals", params={"sort": "protein_per_dollar"}).status_code == 400
+
+
+@pytest.mark.parametrize("snapshot", [True, False])
+def test_cursor_with_bad_id_is_rejected(client, monkeypatch, snapshot):
+    monkeypatch.setattr(main, "CATALOG_SNAPSHOT_MAX_MEALS", 10_000 if snapshot else 0)
+    main.invalidate_meal_caches()
+    for sort, values in (("id", ["not-an-object-id"]), ("protein", [30.0, "zzz"])):
+        response = client.get("/meals", params={"sort": sort, "after": main.encode_cursor(values)})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_oversized_catalog_is_not_fetched(client, monkeypatch):
+    fetches = []
+    get_documents = main.async_get_documents
+
+    async def counted(collection_name, *args, **kwargs):
+        fetches.append(collection_name)
+        return await get_documents(collection_name, *args, **kwargs)
+
+    monkeypatch.setattr(main, "async_get_documents", counted)
+    monkeypatch.setattr(main, "CATALOG_SNAPSHOT_MAX_MEALS", len(MEALS) - 1)
+    main.invalidate_meal_caches()
+    assert asyncio.run(main.get_catalog()) is None
+    assert fetches == []
+
+
+def test_snapshot_fetch_is_projected(client, memory_db):
+    memory_db["meal"].update_many({}, {"$set": {"internal_notes": "x" * 1000}})
+    main.invalidate_meal_caches()
+    catalog = asyncio.run(main.get_catalog())
+    assert len(catalog) == len(MEALS)
+    assert all("internal_notes" not in doc and "macros" in doc for doc in catalog.docs)
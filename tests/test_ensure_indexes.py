@@ -0,0 +1,52 @@
+"""
+ensure_indexes must be able to build the unique meal title index over data
+written before it existed, and must not fail when it still cannot.
+"""
+import asyncio
+import logging
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+import database
+
+
+def insert_duplicate_titles(db) -> list:
+    ids = sorted(ObjectId() for _ in range(4))
+    db["meal"].insert_many([
+        {"_id": ids[2], "title": "Protein Pancakes", "price": 9.99},
+        {"_id": ids[0], "title": "Protein Pancakes", "price": 9.99},
+        {"_id": ids[3], "title": "Spinach Omelette", "price": 8.5},
+        {"_id": ids[1], "title": "Protein Pancakes", "price": 9.99},
+    ])
+    return ids
+
+
+def test_keeps_oldest_meal_per_title(memory_db):
+    ids = insert_duplicate_titles(memory_db)
+    database.ensure_indexes()
+    assert sorted(d["_id"] for d in memory_db["meal"].find()) == [ids[0], ids[3]]
+    with pytest.raises(DuplicateKeyError):
+        memory_db["meal"].insert_one({"title": "Spinach Omelette"})
+
+
+def test_async_keeps_oldest_meal_per_title(memory_db):
+    ids = insert_duplicate_titles(memory_db)
+    asyncio.run(database.async_ensure_indexes())
+    assert sorted(d["_id"] for d in memory_db["meal"].find()) == [ids[0], ids[3]]
+    with pytest.raises(DuplicateKeyError):
+        memory_db["meal"].insert_one({"title": "Protein Pancakes"})
+
+
+def test_unbuildable_unique_index_is_logged_and_skipped(memory_db, monkeypatch, caplog):
+    insert_duplicate_titles(memory_db)
+    monkeypatch.setattr(database, "DEDUPLICATE_BEFORE_INDEXING", {})
+    with caplog.at_level(logging.ERROR, logger="database"):
+        database.ensure_indexes()
+    assert "title_1 not built" in caplog.text
+    assert memory_db["meal"].count_documents({"title": "Protein Pancakes"}) == 3
+    # The unique delivery index after it was still built
+    memory_db["delivery"].insert_one({"subscription_id": 1, "delivery_date": 1})
+    with pytest.raises(DuplicateKeyError):
+        memory_db["delivery"].insert_one({"subscription_id": 1, "delivery_date": 1})
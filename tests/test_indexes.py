@@ -0,0 +1,100 @@
+"""
+Index coverage of the GET /meals query shapes against a real MongoDB.
+
+Needs DATABASE_URL; the indexes are built in a scratch database
+(TEST_DATABASE_NAME, default protein_meals_test) that is dropped afterwards.
+"""
+import os
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL not set")
+
+ID = [("_id", 1)]
+PROTEIN = [("macros.protein", 1), ("_id", 1)]
+CATEGORY = {"category": "Main Meals"}
+VEGAN = {"diet_tags": {"$in": ["vegan"]}}
+MIN_PROTEIN = {"macros.protein": {"$gte": 30}}
+
+# (filter, sort) as built by query_meals in main.py, and the key patterns of
+# the indexes that may serve it
+QUERY_SHAPES = [
+    # Both _id-leading indexes give the same plan for an unfiltered scan
+    ({}, ID, [[("_id", 1)], [("_id", 1), ("macros.protein", 1)]]),
+    (CATEGORY, ID, [[("category", 1), ("_id", 1), ("macros.protein", 1)]]),
+    (VEGAN, ID, [[("diet_tags", 1), ("_id", 1), ("macros.protein", 1)]]),
+    (MIN_PROTEIN, ID, [[("_id", 1), ("macros.protein", 1)]]),
+    ({**CATEGORY, **VEGAN}, ID, [[("category", 1), ("diet_tags", 1), ("_id", 1), ("macros.protein", 1)]]),
+    ({**CATEGORY, **MIN_PROTEIN}, ID, [[("category", 1), ("_id", 1), ("macros.protein", 1)]]),
+    ({**VEGAN, **MIN_PROTEIN}, ID, [[("diet_tags", 1), ("_id", 1), ("macros.protein", 1)]]),
+    ({**CATEGORY, **VEGAN, **MIN_PROTEIN}, ID, [[("category", 1), ("diet_tags", 1), ("_id", 1), ("macros.protein", 1)]]),
+    ({}, PROTEIN, [[("macros.protein", 1), ("_id", 1)]]),
+    (CATEGORY, PROTEIN, [[("category", 1), ("macros.protein", 1), ("_id", 1)]]),
+    (VEGAN, PROTEIN, [[("diet_tags", 1), ("macros.protein", 1), ("_id", 1)]]),
+    (MIN_PROTEIN, PROTEIN, [[("macros.protein", 1), ("_id", 1)]]),
+    ({**CATEGORY, **VEGAN}, PROTEIN, [[("category", 1), ("diet_tags", 1), ("macros.protein", 1), ("_id", 1)]]),
+    ({**CATEGORY, **MIN_PROTEIN}, PROTEIN, [[("category", 1), ("macros.protein", 1), ("_id", 1)]]),
+    ({**VEGAN, **MIN_PROTEIN}, PROTEIN, [[("diet_tags", 1), ("macros.protein", 1), ("_id", 1)]]),
+    ({**CATEGORY, **VEGAN, **MIN_PROTEIN}, PROTEIN, [[("category", 1), ("diet_tags", 1), ("macros.protein", 1), ("_id", 1)]]),
+]
+PAGE_SIZE = 21
+
+
+def plan_nodes(node) -> list:
+    """Every stage node anywhere in an explain plan tree"""
+    nodes = []
+    if isinstance(node, dict):
+        if "stage" in node:
+            nodes.append(node)
+        for value in node.values():
+            nodes.extend(plan_nodes(value))
+    elif isinstance(node, list):
+        for value in node:
+            nodes.extend(plan_nodes(value))
+    return nodes
+
+
+@pytest.fixture(scope="module")
+def meal_collection():
+    from pymongo import MongoClient
+
+    from catalog import CATEGORIES
+    from database import INDEXES
+    from schemas import DIET_TAGS
+
+    client = MongoClient(os.environ["DATABASE_URL"], serverSelectionTimeoutMS=5000)
+    db = client[os.getenv("TEST_DATABASE_NAME", "protein_meals_test")]
+    collection = db["meal"]
+    collection.drop()
+    collection.create_indexes(INDEXES["meal"])
+    collection.insert_many([
+        {
+            "title": f"meal {i}",
+            "category": ("breakfast", "Main Meals", "dinner", "snack")[i % 4],
+            # Independent of category, so every combined filter matches a page
+            "diet_tags": [DIET_TAGS[i // 4 % len(DIET_TAGS)]],
+            "macros": {"protein": float(i % 60), "carbs": 10.0, "fats": 5.0, "calories": 300.0},
+            "price": 5.0 + i % 10,
+        }
+        for i in range(2000)
+    ])
+    yield collection
+    client.drop_database(db.name)
+    client.close()
+
+
+@pytest.mark.parametrize("filter_dict,sort,key_patterns", QUERY_SHAPES)
+def test_meal_query_reads_only_returned_rows(meal_collection, filter_dict, sort, key_patterns):
+    explain = meal_collection.find(filter_dict).sort(sort).limit(PAGE_SIZE).explain()
+    nodes = plan_nodes(explain["queryPlanner"]["winningPlan"])
+    stages = [node["stage"] for node in nodes]
+    scans = [node for node in nodes if node["stage"] == "IXSCAN"]
+    assert len(scans) == 1, stages
+    assert list(scans[0]["keyPattern"].items()) in key_patterns, scans[0]["indexName"]
+    # The index yields rows in sort order, with no in-memory sort
+    assert "SORT" not in stages and "COLLSCAN" not in stages, stages
+
+    stats = explain["executionStats"]
+    assert stats["nReturned"] == PAGE_SIZE
+    # Filters are applied to index keys, so only returned rows are fetched
+    assert stats["totalDocsExamined"] == stats["nReturned"], stats
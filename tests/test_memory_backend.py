@@ -0,0 +1,148 @@
+"""
+The in-process Mongo stand-in must behave like MongoDB for the query,
+update and aggregation shapes the service (and its benchmarks) rely on.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from pymongo import IndexModel, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from memory_backend import MemoryClient
+
+
+@pytest.fixture
+def collection():
+    return MemoryClient()["test"]["items"]
+
+
+def titles(cursor) -> list:
+    return sorted(d["title"] for d in cursor)
+
+
+def test_in_matches_array_members(collection):
+    collection.insert_many([
+        {"title": "a", "diet_tags": ["vegan", "gluten-free"]},
+        {"title": "b", "diet_tags": ["keto"]},
+        {"title": "c", "diet_tags": []},
+        {"title": "d"},
+    ])
+    assert titles(collection.find({"diet_tags": {"$in": ["vegan"]}})) == ["a"]
+    assert titles(collection.find({"diet_tags": {"$in": ["keto", "gluten-free"]}})) == ["a", "b"]
+    # A whole-array operand matches an equal array
+    assert titles(collection.find({"diet_tags": {"$in": [["keto"]]}})) == ["b"]
+    # $in with null matches missing fields
+    assert titles(collection.find({"diet_tags": {"$in": [None]}})) == ["d"]
+    assert titles(collection.find({"diet_tags": {"$nin": ["vegan"]}})) == ["b", "c", "d"]
+
+
+def test_or_cursor_filter(collection):
+    ids = [ObjectId() for _ in range(5)]
+    proteins = [20.0, 30.0, 30.0, 30.0, 40.0]
+    collection.insert_many([{"_id": i, "title": str(n), "macros": {"protein": p}} for n, (i, p) in enumerate(zip(ids, proteins))])
+
+    # The keyset filter GET /meals uses after the page ending at (30.0, ids[1])
+    after = {"$or": [
+        {"macros.protein": {"$gt": 30.0}},
+        {"macros.protein": 30.0, "_id": {"$gt": ids[1]}},
+    ]}
+    cursor = collection.find({"macros.protein": {"$gte": 10}, **after}).sort([("macros.protein", 1), ("_id", 1)])
+    assert [d["_id"] for d in cursor] == [ids[2], ids[3], ids[4]]
+
+
+def test_upsert_builds_document_from_filter_equalities(collection):
+    result = collection.update_one(
+        {"email": "a@example.com", "plan": {"$eq": "gold"}, "age": {"$gt": 18}, "$or": [{"x": 1}, {"x": 2}]},
+        {"$set": {"target": 150}},
+        upsert=True,
+    )
+    assert result.upserted_id is not None
+    doc = collection.find_one({"_id": result.upserted_id}, {"_id": 0})
+    assert doc == {"email": "a@example.com", "plan": "gold", "target": 150}
+
+
+def test_set_on_insert_only_applies_when_inserting(collection):
+    first = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    update = lambda when: {"$set": {"seen": when}, "$setOnInsert": {"created": when}}
+    collection.update_one({"key": 1}, update(first), upsert=True)
+    collection.update_one({"key": 1}, update(first + timedelta(days=1)), upsert=True)
+    doc = collection.find_one({"key": 1})
+    assert doc["created"] == first
+    assert doc["seen"] == first + timedelta(days=1)
+    assert collection.count_documents({}) == 1
+
+
+def test_unique_index_rejects_duplicates(collection):
+    collection.create_indexes([IndexModel([("title", 1)], unique=True)])
+    collection.insert_one({"title": "a"})
+    with pytest.raises(DuplicateKeyError):
+        collection.insert_one({"title": "a"})
+    collection.insert_one({"title": "b"})
+    with pytest.raises(DuplicateKeyError):
+        collection.update_one({"title": "b"}, {"$set": {"title": "a"}})
+    assert titles(collection.find()) == ["a", "b"]
+
+
+def test_ordered_bulk_write_stops_at_duplicate(collection):
+    collection.create_indexes([IndexModel([("title", 1)], unique=True)])
+    ops = [InsertOne({"title": "a"}), InsertOne({"title": "a"}), InsertOne({"title": "b"})]
+    with pytest.raises(BulkWriteError) as raised:
+        collection.bulk_write(ops, ordered=True)
+    details = raised.value.details
+    assert details["nInserted"] == 1
+    assert [(e["index"], e["code"]) for e in details["writeErrors"]] == [(1, 11000)]
+    assert titles(collection.find()) == ["a"]
+
+
+def test_unordered_bulk_write_continues_past_duplicate(collection):
+    collection.create_indexes([IndexModel([("title", 1)], unique=True)])
+    collection.insert_one({"title": "a"})
+    ops = [
+        UpdateOne({"title": "b"}, {"$setOnInsert": {"title": "b"}}, upsert=True),
+        InsertOne({"title": "a"}),
+        UpdateOne({"title": "c"}, {"$set": {"title": "a"}}, upsert=True),
+        InsertOne({"title": "d"}),
+    ]
+    with pytest.raises(BulkWriteError) as raised:
+        collection.bulk_write(ops, ordered=False)
+    details = raised.value.details
+    assert sorted(e["index"] for e in details["writeErrors"]) == [1, 2]
+    assert details["nInserted"] == 1
+    assert [u["index"] for u in details["upserted"]] == [0]
+    assert titles(collection.find()) == ["a", "b", "d"]
+
+
+def test_production_report_pipeline(collection):
+    from main import production_pipeline
+
+    day = datetime(2026, 11, 2, tzinfo=timezone.utc)
+
+    def item(meal_id, servings, protein):
+        return {"meal_id": meal_id, "servings": servings, "title": meal_id.upper(), "macros": {"protein": protein * servings, "carbs": 1.0, "fats": 1.0, "calories": 100.0}}
+
+    collection.insert_many([
+        {"delivery_date": day, "items": [item("a", 1.0, 30), item("b", 2.0, 20)]},
+        {"delivery_date": day, "items": [item("a", 1.5, 30)]},
+        {"delivery_date": day + timedelta(days=1), "items": [item("b", 1.0, 20)]},
+        {"delivery_date": day + timedelta(days=1), "items": []},
+        {"delivery_date": day + timedelta(days=7), "items": [item("a", 1.0, 30)]},  # outside the range
+    ])
+    rows = list(collection.aggregate(production_pipeline(day, day + timedelta(days=2))))
+
+    assert [(r["date"], r["meal_id"]) for r in rows] == [(day, "a"), (day, "b"), (day + timedelta(days=1), "b")]
+    first = rows[0]
+    assert first == {
+        "date": day,
+        "meal_id": "a",
+        "title": "A",
+        "servings": 2.5,
+        "deliveries": 2,
+        "protein": 75.0,
+        "carbs": 2.0,
+        "fats": 2.0,
+        "calories": 200.0,
+    }
+    assert rows[1]["servings"] == 2.0 and rows[1]["protein"] == 40.0
+    # $unwind works on copies; stored deliveries keep their item arrays
+    assert len(collection.find_one({"delivery_date": day})["items"]) == 2
@@ -0,0 +1,87 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import planner
+from catalog import CatalogSnapshot
+
+
+def make_catalog(meals):
+    """meals: (title, protein per serving, price) tuples"""
+    return CatalogSnapshot([
+        {"_id": f"{i:024x}", "title": title, "price": price, "category": "lunch", "diet_tags": [], "macros": {"protein": protein, "carbs": 0, "fats": 0, "calories": protein * 10}}
+        for i, (title, protein, price) in enumerate(meals)
+    ])
+
+
+def plan_titles(catalog, plan):
+    return {catalog.docs[row]["title"]: float(s) for row, s in zip(plan["rows"].tolist(), plan["servings"])}
+
+
+def brute_force_cost(catalog, target, max_meals, max_servings=planner.MAX_SERVINGS):
+    levels = planner.serving_levels(max_servings)
+    grams = np.floor(np.outer(catalog.protein, levels) + 1e-9)
+    costs = np.outer(catalog.price, levels)
+    best = None
+    for size in range(1, max_meals + 1):
+        for combo in itertools.combinations(range(len(catalog)), size):
+            # Every combination of serving levels for these meals at once
+            total_grams = sum(np.ix_(*[grams[row] for row in combo]))
+            total_cost = sum(np.ix_(*[costs[row] for row in combo]))
+            reached = total_cost[total_grams >= target]
+            if reached.size and (best is None or reached.min() < best):
+                best = float(reached.min())
+    return best
+
+
+def test_single_meal_slot_uses_high_protein_meal():
+    catalog = make_catalog([("A", 10, 1.0), ("D", 50, 6.0)])
+    plan = planner.optimize(catalog, 60, np.ones(2, dtype=bool), max_meals=1)
+    assert plan["feasible"]
+    assert plan_titles(catalog, plan) == {"D": 1.25}
+
+
+def test_two_meal_slots_skip_cheapest_per_gram_when_it_cannot_reach_target():
+    catalog = make_catalog([("A", 10, 1.0), ("C", 10, 1.5), ("D", 50, 6.0)])
+    plan = planner.optimize(catalog, 120, np.ones(3, dtype=bool), max_meals=2)
+    assert plan["feasible"]
+    assert "D" in plan_titles(catalog, plan)
+    protein = (catalog.protein[plan["rows"]] * plan["servings"]).sum()
+    assert protein >= 120
+
+
+def test_infeasible_returns_highest_protein_meals():
+    catalog = make_catalog([("A", 10, 1.0), ("D", 50, 6.0)])
+    plan = planner.optimize(catalog, 400, np.ones(2, dtype=bool), max_meals=1)
+    assert not plan["feasible"]
+    assert plan_titles(catalog, plan) == {"D": planner.MAX_SERVINGS}
+
+
+def test_small_cheap_meal_can_cover_the_remainder():
+    # The 8.89 g meal has the worst cost per gram, but half a serving of it
+    # tops up 1.5 servings of A more cheaply than a larger serving of A
+    catalog = make_catalog([("A", 40.68, 3.52), ("B", 30, 3.3), ("C", 20, 2.2), ("D", 8.89, 1.15)])
+    plan = planner.optimize(catalog, 61.8, np.ones(4, dtype=bool), max_meals=2)
+    assert plan["feasible"]
+    assert plan_titles(catalog, plan) == {"A": 1.5, "D": 0.5}
+
+
+@pytest.mark.parametrize("seed", range(400))
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    size = int(rng.integers(5, 9))
+    catalog = make_catalog([(str(i), round(float(rng.uniform(5, 60)), 2), round(float(rng.uniform(2, 15)), 2)) for i in range(size)])
+    target = round(float(rng.uniform(30, 250)), 1)
+    max_meals = int(rng.integers(1, 4))
+    max_servings = float(rng.choice([planner.MIN_SERVINGS, 1.0, 2.75, 3.6, planner.MAX_SERVINGS]))
+    plan = planner.optimize(catalog, target, np.ones(size, dtype=bool), max_meals=max_meals, max_servings=max_servings)
+    expected = brute_force_cost(catalog, target, max_meals, max_servings)
+    if expected is None:
+        assert not plan["feasible"]
+        return
+    assert plan["feasible"]
+    assert len(plan["rows"]) <= max_meals
+    assert set(plan["servings"].tolist()) <= set(planner.serving_levels(max_servings).tolist())
+    assert np.floor(catalog.protein[plan["rows"]] * plan["servings"] + 1e-9).sum() >= target
+    assert float((catalog.price[plan["rows"]] * plan["servings"]).sum()) == pytest.approx(expected)
@@ -0,0 +1,49 @@
+"""
+A worker must come up when MongoDB is unreachable at startup, report the
+outage on GET /test and keep retrying database setup in the background.
+"""
+import dataclasses
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+
+
+@pytest.fixture
+def unreachable_db(monkeypatch):
+    database.close_clients()
+    settings = dataclasses.replace(
+        database.mongo_settings,
+        backend="mongo",
+        url="mongodb://127.0.0.1:1",
+        name="test",
+        server_selection_timeout_ms=100,
+        connect_timeout_ms=100,
+    )
+    monkeypatch.setattr(database, "mongo_settings", settings)
+    yield
+    database.close_clients()
+
+
+def test_starts_and_retries_when_database_is_unreachable(unreachable_db, monkeypatch):
+    attempts = []
+    prepare = main.prepare_database
+
+    async def counted():
+        attempts.append(time.monotonic())
+        return await prepare()
+
+    monkeypatch.setattr(main, "prepare_database", counted)
+    monkeypatch.setattr(main, "SETUP_RETRY_MIN_SECONDS", 0.01)
+    with TestClient(main.app) as client:
+        response = client.get("/test")
+        deadline = time.monotonic() + 5
+        while len(attempts) < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    assert response.status_code == 200
+    assert "Error" in response.json()["database"]
+    assert len(attempts) >= 3